@@ -0,0 +1,271 @@
+#!/usr/bin/python3
+# Copyright (C) 2005-2022 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+# ****************************************************************************
+
+
+""" Generator benchmark: Run the maker for a fixed number of
+    generations with fixed seeds for each variant and record per
+    generation the number of evaluations, the cache hit ratio, mean and
+    99th percentile evaluation latency, best evaluation, wall time and
+    (every rss_interval generations) the resident set size. Each run is
+    summarized by the time to the first unique puzzle, the number of
+    distinct unique puzzles per hour and the 99th percentile evaluation
+    latency over the whole run. Every run is done in a fresh
+    process, so the class-wide caches of the maker start empty.
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import pga
+from   concurrent.futures  import ProcessPoolExecutor
+from   argparse            import ArgumentParser
+from   sudokumaker.maker   import Sudoku_Maker
+from   sudokumaker.Version import VERSION
+
+variants = dict \
+    ( plain    = dict ()
+    , diagonal = dict (diagonal = True)
+    , color    = dict (colorconstrained = True)
+    )
+
+def rss ():
+    """ Current resident set size in kB, the peak if the current value
+        is not available (no /proc).
+        >>> rss () > 0
+        True
+    """
+    try:
+        with open ('/proc/self/statm') as f:
+            pages = int (f.read ().split () [1])
+        return pages * os.sysconf ('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        return resource.getrusage (resource.RUSAGE_SELF).ru_maxrss
+# end def rss
+
+def percentile (values, q):
+    """ The q-quantile of the sorted list values
+        >>> percentile (list (range (100)), 0.99)
+        99
+        >>> percentile ([], 0.5)
+    """
+    if not values:
+        return None
+    return values [min (int (q * len (values)), len (values) - 1)]
+# end def percentile
+
+class Telemetry_Maker (Sudoku_Maker):
+    """ Sudoku_Maker recording telemetry of each generation """
+
+    def __init__ (self, rss_interval = 5, **kw):
+        self.rss_interval = rss_interval
+        self.telemetry    = []
+        self.latency      = []
+        self.latencies    = []
+        self.unique       = set ()
+        self.last         = (time.time (), 0)
+        self.__super.__init__ (**kw)
+    # end def __init__
+
+    def evaluate (self, p, pop):
+        before = time.perf_counter ()
+        eval   = self.__super.evaluate (p, pop)
+        self.latency.append (time.perf_counter () - before)
+        if eval <= 81 + self.band_penalty:
+            self.unique.add (self.genome (p, pop))
+        return eval
+    # end def evaluate
+
+    def endofgen (self):
+        self.__super.endofgen ()
+        now         = time.time ()
+        last, hits  = self.last
+        evaluations = len (self.latency)
+        cached      = self.cache_hits - hits
+        latency     = sorted (self.latency)
+        pop         = pga.PGA_NEWPOP
+        best        = self.get_best_index (pop)
+        record = dict \
+            ( generation  = self.GA_iter
+            , evaluations = evaluations
+            , cache_hits  = cached
+            , cache_ratio = cached / ((cached + evaluations) or 1)
+            , latency_mean =
+                1000 * sum (latency) / evaluations if evaluations else None
+            , latency_p99 = 1000 * (percentile (latency, 0.99) or 0)
+            , best        = self.get_evaluation (best, pop)
+            , unique      = len (self.unique)
+            , seconds     = now - last
+            , wall        = now - self.started
+            )
+        if (self.GA_iter - 1) % self.rss_interval == 0:
+            record ['rss'] = rss ()
+        self.telemetry.append (record)
+        self.latencies.extend (self.latency)
+        self.latency = []
+        self.last    = (now, self.cache_hits)
+    # end def endofgen
+
+    def summary (self):
+        wall     = time.time () - self.started
+        first    = self.first_unique
+        evals    = sum (r ['evaluations'] for r in self.telemetry)
+        cached   = sum (r ['cache_hits']  for r in self.telemetry)
+        return dict \
+            ( wall              = wall
+            , generations       = len (self.telemetry)
+            , evaluations       = evals
+            , cache_ratio       = cached / ((cached + evals) or 1)
+            , first_unique_generation = first [0] if first else None
+            , first_unique_seconds    = first [1] if first else None
+            , unique            = len (self.unique)
+            , puzzles_per_hour  = 3600 * len (self.unique) / wall
+            , best              = self.telemetry [-1]['best']
+            , latency_p99       =
+                1000 * (percentile (sorted (self.latencies), 0.99) or 0)
+            , peak_rss          =
+                resource.getrusage (resource.RUSAGE_SELF).ru_maxrss
+            , outcomes          = dict (self.outcomes)
+            , stages            = dict (self.stages)
+            )
+    # end def summary
+
+# end class Telemetry_Maker
+
+def quiet ():
+    """ Discard the report of the GA library in the worker process """
+    devnull = os.open (os.devnull, os.O_WRONLY)
+    os.dup2 (devnull, 1)
+# end def quiet
+
+def run (variant, seed, generations, rss_interval, kw):
+    """ One benchmark run, executed in a worker process """
+    maker = Telemetry_Maker \
+        ( srand        = seed
+        , generations  = generations
+        , rss_interval = rss_interval
+        , **dict (kw, **variants [variant])
+        )
+    maker.run ()
+    return dict \
+        ( variant   = variant
+        , seed      = seed
+        , summary   = maker.summary ()
+        , telemetry = maker.telemetry
+        )
+# end def run
+
+def main (argv = None):
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( "-G", "--generations"
+        , dest    = "generations"
+        , help    = "Number of generations per run, default=%(default)s"
+        , type    = int
+        , default = 20
+        )
+    cmd.add_argument \
+        ( "-i", "--init"
+        , dest    = "init"
+        , help    = "Initialization of the population, see sudokumaker,"
+                    " default=%(default)s"
+        , choices = ('random', 'grid')
+        , default = 'grid'
+        )
+    cmd.add_argument \
+        ( "-j", "--json"
+        , dest    = "json"
+        , help    = "Write results as JSON to this file"
+        )
+    cmd.add_argument \
+        ( "-O", "--operators"
+        , dest    = "operators"
+        , help    = "Mutation and crossover, see sudokumaker,"
+                    " default=%(default)s"
+        , choices = ('default', 'sudoku')
+        , default = 'sudoku'
+        )
+    cmd.add_argument \
+        ( "--rss-interval"
+        , dest    = "rss_interval"
+        , help    = "Generations between samples of the resident set size,"
+                    " default=%(default)s"
+        , type    = int
+        , default = 5
+        )
+    cmd.add_argument \
+        ( "-s", "--seed"
+        , dest    = "seeds"
+        , help    = "Random seed, can be given several times,"
+                    " default: 1 2 3"
+        , type    = int
+        , action  = "append"
+        )
+    cmd.add_argument \
+        ( "-V", "--variant"
+        , dest    = "variants"
+        , help    = "Puzzle variant, can be given several times,"
+                    " default: plain"
+        , choices = sorted (variants)
+        , action  = "append"
+        )
+    args = cmd.parse_args (argv)
+    kw   = dict (init = args.init, operators = args.operators)
+    result = dict \
+        ( version     = VERSION
+        , generations = args.generations
+        , parameters  = kw
+        , runs        = []
+        )
+    print \
+        ( "%-8s %5s %8s %6s %8s %9s %7s %6s %8s %8s"
+        % ( 'variant', 'seed', 'wall', 'evals', 'cache', 'first', 'unique'
+          , 'best', 'per hour', 'p99 ms'
+          )
+        )
+    for variant in args.variants or ['plain']:
+        for seed in args.seeds or [1, 2, 3]:
+            with ProcessPoolExecutor (max_workers = 1, initializer = quiet) \
+                as pool:
+                r = pool.submit \
+                    ( run, variant, seed, args.generations
+                    , args.rss_interval, kw
+                    ).result ()
+            result ['runs'].append (r)
+            s = r ['summary']
+            first = s ['first_unique_seconds']
+            print \
+                ( "%-8s %5d %8.1f %6d %7.1f%% %9s %7d %6d %8.1f %8.1f"
+                % ( variant, seed, s ['wall'], s ['evaluations']
+                  , 100 * s ['cache_ratio']
+                  , '-' if first is None else '%.1fs' % first
+                  , s ['unique'], s ['best'], s ['puzzles_per_hour']
+                  , s ['latency_p99']
+                  )
+                )
+    if args.json:
+        with open (args.json, 'w') as f:
+            json.dump (result, f, indent = 2)
+# end def main
+
+if __name__ == '__main__':
+    main (sys.argv [1:])
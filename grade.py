@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+# Copyright (C) 2005-2022 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+# ****************************************************************************
+
+""" Difficulty grading.
+    A puzzle is solved with the propagation rules of Alternatives in
+    ascending strength (see Alternatives.level). The grade records the
+    lowest level that solves the puzzle without guessing, if none does,
+    the number of branch points the search needs with all rules.
+"""
+
+import sys
+import json
+from   math                   import log
+from   copy                   import deepcopy
+from   argparse               import ArgumentParser
+from   sudokumaker.sudoku     import Puzzle, Alternatives
+from   sudokumaker.Version    import VERSION
+
+# Name of each level, the last level needs search
+levels = (None, 'naked singles', 'hidden singles', 'subsets', 'search')
+tiers  = (None, 'easy',          'medium',         'hard',    'expert')
+
+class Grade:
+    """ Difficulty of a puzzle.
+        level is the index into levels, nodes the number of branch
+        points and steps the propagation steps of the solver,
+        solvecount is the number of solutions (up to 2). If the node
+        budget is exceeded, exceeded is set. The rating is the level
+        for puzzles solved without search, otherwise it grows with the
+        logarithm of the number of branch points.
+        >>> Grade (2, 0, 120, 1).rating
+        2.0
+        >>> g = Grade (4, 7, 1000, 1)
+        >>> g.rating, g.tier
+        (7.0, 'expert')
+        >>> Grade (4, 7, 1000, 2).tier
+        'invalid'
+    """
+
+    def __init__ (self, level, nodes, steps, solvecount, exceeded = None):
+        self.level      = level
+        self.nodes      = nodes
+        self.steps      = steps
+        self.solvecount = solvecount
+        self.exceeded   = exceeded
+    # end def __init__
+
+    @property
+    def rating (self):
+        if self.level < len (levels) - 1:
+            return float (self.level)
+        return self.level + log (self.nodes + 1, 2)
+    # end def rating
+
+    @property
+    def tier (self):
+        if self.solvecount != 1 or self.exceeded:
+            return 'invalid'
+        return tiers [self.level]
+    # end def tier
+
+    def as_dict (self):
+        return dict \
+            ( level      = levels [self.level]
+            , tier       = self.tier
+            , rating     = self.rating
+            , nodes      = self.nodes
+            , steps      = self.steps
+            , solvecount = self.solvecount
+            , exceeded   = self.exceeded
+            )
+    # end def as_dict
+
+    def __str__ (self):
+        return "%-7s %5.2f %-14s nodes: %d steps: %d" \
+            % (self.tier, self.rating, levels [self.level], self.nodes
+              , self.steps
+              )
+    # end def __str__
+    __repr__ = __str__
+
+# end class Grade
+
+def solved (alt):
+    """ True if alt is solved by propagation alone """
+    return alt.solvable and all (len (t) == 1 for t in alt.tile.values ())
+# end def solved
+
+def grade (puzzle, maxnodes = None):
+    """ Grade puzzle (a Puzzle), maxnodes limits the search.
+        >>> s = '000720800741003260200050300407090000010000080'
+        >>> s += '600008900100000450050840706070069002'
+        >>> g = grade (Puzzle.from_bytes (bytes (int (c) for c in s)))
+        >>> g.tier, g.rating, levels [g.level]
+        ('medium', 2.0, 'hidden singles')
+        >>> s = '003000007050000003000123406001900008009000072'
+        >>> s += '578002010000807000385260000004090200'
+        >>> g = grade (Puzzle.from_bytes (bytes (int (c) for c in s)))
+        >>> g.tier, levels [g.level], g.nodes
+        ('hard', 'subsets', 0)
+        >>> s = '300704800001000200200050000407090000010000080'
+        >>> s += '600008900100000050050000706000069002'
+        >>> g = grade (Puzzle.from_bytes (bytes (int (c) for c in s)))
+        >>> g.tier, levels [g.level], g.solvecount
+        ('invalid', 'search', 0)
+        >>> grade (Puzzle ()).tier
+        'invalid'
+    """
+    steps = 0
+    for level in range (1, len (levels) - 1):
+        alt = Alternatives \
+            ( puzzle.puzzle
+            , diagonal         = puzzle.diagonal
+            , colorconstrained = puzzle.colorconstrained
+            , kikagaku         = puzzle.kikagaku
+            , cages            = puzzle.cages
+            , level            = level
+            )
+        steps += alt.steps
+        if solved (alt):
+            return Grade (level, 0, steps, 1)
+    p = Puzzle \
+        ( verbose          = False
+        , solvemax         = 2
+        , diagonal         = puzzle.diagonal
+        , colorconstrained = puzzle.colorconstrained
+        , maxnodes         = maxnodes
+        )
+    p.puzzle   = deepcopy (puzzle.puzzle)
+    p.kikagaku = puzzle.kikagaku
+    p.cages    = puzzle.cages
+    # The search starts from the propagation with all rules, its steps
+    # are already counted
+    p.solve (alt)
+    return Grade \
+        ( len (levels) - 1, p.nodes, steps - alt.steps + p.steps
+        , p.solvecount, p.exceeded
+        )
+# end def grade
+
+def main (argv = None):
+    # Puzzle reading is shared with the TeX booklet
+    from sudokumaker.sudoku_as_tex import read_puzzles
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( "file"
+        , help    = "File name(s) of sudoku files with one or more puzzles"
+                    " separated by blank lines, default stdin"
+        , nargs   = '*'
+        )
+    cmd.add_argument \
+        ( "-c", "--colorconstrained"
+        , help    = "Add constraint that same colors must be different"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-d", "--diagonal"
+        , help    = "Add constraint that diagonals must be unique"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-j", "--json"
+        , help    = "Output one line of JSON per puzzle"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-K", "--killer"
+        , help    = "Killer sudoku: Cages follow each puzzle"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-k", "--kikagaku"
+        , help    = "Kikagaku sudoku: Different colors must be unique"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-n", "--maxnodes"
+        , dest    = "maxnodes"
+        , help    = "Maximum number of branch points per puzzle"
+        , type    = int
+        )
+    cmd.add_argument \
+        ( "-v", "--version"
+        , help    = "Display version"
+        , action  = "version"
+        , version = "%%(prog)s %s" % VERSION
+        )
+    args = cmd.parse_args (argv)
+    kw   = dict \
+        ( verbose          = False
+        , diagonal         = args.diagonal
+        , colorconstrained = args.colorconstrained
+        , kikagaku         = args.kikagaku
+        , killer           = args.killer
+        )
+    count = {}
+    n     = 0
+    for fn in args.file or [None]:
+        with (open (fn) if fn else sys.stdin) as f:
+            for p in read_puzzles (f, **kw):
+                n += 1
+                g = grade (p, args.maxnodes)
+                count [g.tier] = count.get (g.tier, 0) + 1
+                if args.json:
+                    print (json.dumps (dict (g.as_dict (), puzzle = n)))
+                else:
+                    print ("%5d %s" % (n, g))
+    if not args.json:
+        for t in tiers [1:] + ('invalid',):
+            if t in count:
+                print ("%-7s %5d" % (t, count [t]))
+# end def main
+
+if __name__ == '__main__':
+    main (sys.argv [1:])
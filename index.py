@@ -0,0 +1,439 @@
+#!/usr/bin/python3
+# Copyright (C) 2005-2022 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+# ****************************************************************************
+
+""" Persistent index of generated puzzles for finding duplicates
+    across runs. Puzzles are stored in canonical form (see canonical)
+    together with their variant, so puzzles that only differ by
+    renumbering, rotation or mirroring are found, too. Other
+    equivalences of plain sudokus (permutation of bands, stacks or of
+    the rows and columns inside them) are not detected.
+    The index is a directory with two files: A Bloom filter of fixed
+    size that answers most queries for new puzzles without touching
+    the table, and the exact table, an open addressing hash table of
+    fixed size records. Both are memory mapped, the table doubles its
+    size when it gets too full.
+"""
+
+import os
+import sys
+import mmap
+import struct
+from   hashlib                import blake2b
+from   argparse               import ArgumentParser
+from   sudokumaker.Version    import VERSION
+
+def _symmetries ():
+    """ The 8 rotations and reflections of the grid as tuples of
+        source indexes. These keep rows, columns, quadrants, the two
+        diagonals and the positions inside quadrants (colors) intact.
+    """
+    maps = \
+        ( lambda r, c: (r, c)
+        , lambda r, c: (c, 8 - r)
+        , lambda r, c: (8 - r, 8 - c)
+        , lambda r, c: (8 - c, r)
+        , lambda r, c: (c, r)
+        , lambda r, c: (r, 8 - c)
+        , lambda r, c: (8 - c, 8 - r)
+        , lambda r, c: (8 - r, c)
+        )
+    result = []
+    for m in maps:
+        result.append \
+            (tuple (9 * m (r, c) [0] + m (r, c) [1]
+                    for r in range (9) for c in range (9)
+                   )
+            )
+    return tuple (result)
+# end def _symmetries
+
+symmetries = _symmetries ()
+
+def relabel (vals):
+    """ Renumber digits in order of first appearance
+        >>> relabel (bytes ([0, 5, 3, 5, 0, 1]))
+        b'\\x00\\x01\\x02\\x01\\x00\\x03'
+    """
+    m = {0: 0}
+    for v in vals:
+        if v not in m:
+            m [v] = len (m)
+    return bytes (m [v] for v in vals)
+# end def relabel
+
+def canonical (vals, spatial = True):
+    """ Canonical form of a puzzle given as 81 bytes: The smallest
+        relabeled form of all rotations and reflections. Without
+        spatial (for layouts that are not symmetric) only renumbering
+        is done. Only these 8 symmetries and renumbering are covered,
+        puzzles that differ by a permutation of bands or stacks get
+        different canonical forms.
+        >>> s = '000720800741003260200050300407090000010000080'
+        >>> s += '600008900100000450050840706070069002'
+        >>> p = bytes (int (c) for c in s)
+        >>> q = bytes (v and v % 9 + 1 for v in p)
+        >>> t = bytes (p [9 * c + r] for r in range (9) for c in range (9))
+        >>> canonical (p) == canonical (q) == canonical (t)
+        True
+        >>> canonical (p, spatial = False) == canonical (t, spatial = False)
+        False
+    """
+    if not spatial:
+        return relabel (vals)
+    return min (relabel (bytes (vals [i] for i in s)) for s in symmetries)
+# end def canonical
+
+def pack (vals):
+    """ Two tiles per byte
+        >>> pack (bytes ([1, 2, 3])) [:3]
+        b'!\\x03\\x00'
+    """
+    vals = bytes (vals).ljust (82, b'\0')
+    return bytes (vals [i] | (vals [i + 1] << 4) for i in range (0, 81, 2))
+# end def pack
+
+def unpack (packed):
+    """ Inverse of pack
+        >>> unpack (pack (bytes (range (9)) * 9)) == bytes (range (9)) * 9
+        True
+    """
+    vals = []
+    for b in packed:
+        vals.append (b & 15)
+        vals.append (b >> 4)
+    return bytes (vals [:81])
+# end def unpack
+
+class Puzzle_Index:
+    """ Persistent set of puzzles in directory.
+        Records are one byte of flags (used, variant), 8 bytes digest
+        of the kikagaku or killer layout and the packed canonical
+        puzzle. The size of the Bloom filter (bloom_bytes) fixes the
+        memory used, with the default of 16MB and 20 million puzzles
+        about 5% of the queries for new puzzles need a table lookup.
+        >>> import tempfile
+        >>> d = tempfile.mkdtemp ()
+        >>> idx = Puzzle_Index (d, slots = 4, bloom_bytes = 64)
+        >>> p = bytes (range (9)) * 9
+        >>> idx.add (idx.key (p)), idx.add (idx.key (p [::-1])), len (idx)
+        (True, False, 1)
+        >>> idx.add (idx.key (p, diagonal = True))
+        True
+        >>> idx.key (p [:-1] + b'0') in idx
+        False
+        >>> for k in range (1, 9):
+        ...     _ = idx.add (idx.key (b'\\1' * k + bytes (81 - k)))
+        >>> idx.slots, len (idx)
+        (16, 10)
+        >>> idx.close ()
+        >>> idx = Puzzle_Index (d)
+        >>> idx.key (p) in idx, len (idx)
+        (True, 10)
+        >>> idx.close ()
+    """
+    magic       = b'SUDIDX1\0'
+    header      = struct.Struct ('<8sQQ')
+    record_size = 1 + 8 + 41
+    max_load    = 0.75
+    # Flag bits of the first record byte
+    used        = 1
+    variants    = \
+        ( ('diagonal', 2), ('colorconstrained', 4)
+        , ('kikagaku', 8), ('cages', 16)
+        )
+
+    def __init__ \
+        ( self
+        , directory
+        , slots       = 1 << 16
+        , bloom_bytes = 1 << 24
+        , hashes      = 7
+        ):
+        self.directory  = directory
+        self.hashes     = hashes
+        self.bloom_hits = 0
+        self.queries    = 0
+        if not os.path.isdir (directory):
+            os.makedirs (directory)
+        self.table_name = os.path.join (directory, 'table')
+        self.bloom_name = os.path.join (directory, 'bloom')
+        if not os.path.exists (self.table_name):
+            self.create (self.table_name, slots * self.record_size, slots)
+        if not os.path.exists (self.bloom_name):
+            self.create (self.bloom_name, bloom_bytes, hashes)
+        self.table, self.slots, self.count = self.open (self.table_name)
+        self.bloom, self.hashes, n         = self.open (self.bloom_name)
+        self.bloom_bits = (len (self.bloom) - self.header.size) * 8
+    # end def __init__
+
+    def create (self, name, size, param):
+        with open (name + '.tmp', 'wb') as f:
+            f.write (self.header.pack (self.magic, param, 0))
+            f.truncate (self.header.size + size)
+        os.replace (name + '.tmp', name)
+    # end def create
+
+    def open (self, name):
+        """ Map file name, return the map and the header parameters """
+        with open (name, 'r+b') as f:
+            m = mmap.mmap (f.fileno (), 0)
+        magic, param, count = self.header.unpack_from (m)
+        if magic != self.magic:
+            raise ValueError ("%s is not a puzzle index" % name)
+        return m, param, count
+    # end def open
+
+    def key (self, vals, diagonal = False, colorconstrained = False
+            , kikagaku = None, cages = None
+            ):
+        """ Record for the puzzle given as 81 bytes in the given variant.
+            Kikagaku layouts and killer cages are not symmetric in
+            general, for these only renumbering is done (and none for
+            killer cages because the sums depend on the numbers).
+        """
+        variant = dict \
+            ( diagonal         = diagonal
+            , colorconstrained = colorconstrained
+            , kikagaku         = kikagaku
+            , cages            = cages
+            )
+        flags  = self.used
+        digest = bytes (8)
+        for name, bit in self.variants:
+            if variant [name]:
+                flags |= bit
+        if kikagaku or cages:
+            layout = repr ((kikagaku, cages)).encode ('ascii')
+            digest = blake2b (layout, digest_size = 8).digest ()
+        if cages:
+            vals = bytes (vals)
+        else:
+            vals = canonical (vals, spatial = not kikagaku)
+        return bytes ([flags]) + digest + pack (vals)
+    # end def key
+
+    def puzzle_key (self, puzzle):
+        """ Record for a Puzzle """
+        return self.key \
+            ( puzzle.as_bytes ()
+            , diagonal         = puzzle.diagonal
+            , colorconstrained = puzzle.colorconstrained
+            , kikagaku         = puzzle.kikagaku
+            , cages            = puzzle.cages
+            )
+    # end def puzzle_key
+
+    def _hash (self, record):
+        h = blake2b (record, digest_size = 16).digest ()
+        return \
+            ( int.from_bytes (h [:8], 'little')
+            , int.from_bytes (h [8:], 'little')
+            )
+    # end def _hash
+
+    def _bloom_bits (self, h1, h2):
+        for i in range (self.hashes):
+            bit = (h1 + i * h2) % self.bloom_bits
+            yield self.header.size + (bit >> 3), 1 << (bit & 7)
+    # end def _bloom_bits
+
+    def _find (self, record, h1):
+        """ Offset of record in the table or of the free slot for it """
+        size = self.record_size
+        slot = h1 % self.slots
+        while True:
+            off = self.header.size + slot * size
+            r   = self.table [off:off + size]
+            if r [0] == 0 or r == record:
+                return off
+            slot = (slot + 1) % self.slots
+    # end def _find
+
+    def __contains__ (self, record):
+        self.queries += 1
+        h1, h2 = self._hash (record)
+        for off, bit in self._bloom_bits (h1, h2):
+            if not self.bloom [off] & bit:
+                return False
+        self.bloom_hits += 1
+        off = self._find (record, h1)
+        return self.table [off] != 0
+    # end def __contains__
+
+    def add (self, record):
+        """ Add record, return False if it was already in the index """
+        if record in self:
+            return False
+        if self.count + 1 > self.max_load * self.slots:
+            self.grow ()
+        h1, h2 = self._hash (record)
+        for off, bit in self._bloom_bits (h1, h2):
+            self.bloom [off] |= bit
+        off = self._find (record, h1)
+        self.table [off:off + self.record_size] = record
+        self.count += 1
+        self.header.pack_into \
+            (self.table, 0, self.magic, self.slots, self.count)
+        return True
+    # end def add
+
+    def records (self, table = None):
+        """ Yield the used records of table (default: our table) """
+        if table is None:
+            table = self.table
+        size = self.record_size
+        for off in range (self.header.size, len (table), size):
+            if table [off]:
+                yield table [off:off + size]
+    # end def records
+
+    def grow (self):
+        """ Rebuild the table with twice the number of slots. The
+            records are copied one at a time from the old map into the
+            new one, memory use does not grow with the size of the
+            index. The old table is replaced when the copy is complete.
+        """
+        old   = self.table
+        name  = self.table_name + '.new'
+        slots = 2 * self.slots
+        self.create (name, slots * self.record_size, slots)
+        self.table, self.slots, n = self.open (name)
+        for r in self.records (old):
+            off = self._find (r, self._hash (r) [0])
+            self.table [off:off + self.record_size] = r
+        self.header.pack_into \
+            (self.table, 0, self.magic, self.slots, self.count)
+        self.table.flush ()
+        old.close ()
+        os.replace (name, self.table_name)
+    # end def grow
+
+    def __len__ (self):
+        return self.count
+    # end def __len__
+
+    def close (self):
+        self.table.flush ()
+        self.bloom.flush ()
+        self.table.close ()
+        self.bloom.close ()
+    # end def close
+
+# end class Puzzle_Index
+
+def main (argv = None):
+    # Puzzle reading is shared with the TeX booklet
+    from sudokumaker.sudoku_as_tex import read_blocks, puzzle_from_lines
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( "file"
+        , help    = "File name(s) of sudoku files with one or more puzzles"
+                    " separated by blank lines, default stdin"
+        , nargs   = '*'
+        )
+    cmd.add_argument \
+        ( "-b", "--bloom-size"
+        , dest    = "bloom_bytes"
+        , help    = "Size of the Bloom filter of a new index in bytes,"
+                    " default=%(default)s"
+        , type    = int
+        , default = 1 << 24
+        )
+    cmd.add_argument \
+        ( "-c", "--colorconstrained"
+        , help    = "Add constraint that same colors must be different"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-d", "--diagonal"
+        , help    = "Add constraint that diagonals must be unique"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-i", "--index"
+        , dest    = "index"
+        , help    = "Directory of the index, default=%(default)s"
+        , default = 'sudoku-index'
+        )
+    cmd.add_argument \
+        ( "-K", "--killer"
+        , help    = "Killer sudoku: Cages follow each puzzle"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-k", "--kikagaku"
+        , help    = "Kikagaku sudoku: Different colors must be unique"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-n", "--dry-run"
+        , dest    = "dry_run"
+        , help    = "Only check, don't add new puzzles to the index"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-u", "--unique"
+        , dest    = "unique"
+        , help    = "Copy the puzzles not yet in the index to stdout"
+                    " instead of reporting each puzzle"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-v", "--version"
+        , help    = "Display version"
+        , action  = "version"
+        , version = "%%(prog)s %s" % VERSION
+        )
+    args = cmd.parse_args (argv)
+    kw   = dict \
+        ( verbose          = False
+        , diagonal         = args.diagonal
+        , colorconstrained = args.colorconstrained
+        , kikagaku         = args.kikagaku
+        , killer           = args.killer
+        )
+    idx  = Puzzle_Index (args.index, bloom_bytes = args.bloom_bytes)
+    n    = dup = 0
+    for fn in args.file or [None]:
+        with (open (fn) if fn else sys.stdin) as f:
+            for block in read_blocks (f):
+                n  += 1
+                key = idx.puzzle_key (puzzle_from_lines (block, **kw))
+                if args.dry_run:
+                    new = key not in idx
+                else:
+                    new = idx.add (key)
+                dup += not new
+                if args.unique:
+                    if new:
+                        sys.stdout.write (''.join (block) + '\n')
+                else:
+                    print ("%5d %s" % (n, 'new' if new else 'duplicate'))
+    print \
+        ( "%d puzzles, %d duplicates, %d in index"
+        % (n, dup, len (idx))
+        , file = sys.stderr if args.unique else sys.stdout
+        )
+    idx.close ()
+# end def main
+
+if __name__ == '__main__':
+    main (sys.argv [1:])
@@ -0,0 +1,394 @@
+#!/usr/bin/python3
+# Copyright (C) 2005-2022 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+# ****************************************************************************
+
+
+""" Generator of kikagaku layouts: Random partitions of the grid into
+    nine connected regions of nine tiles each. Starting from the 3X3
+    quadrants, a layout is modified by exchanging a tile at the border
+    of two regions against a tile of the other region, a move is only
+    done if both regions stay connected. After a number of moves the
+    layout is checked for a valid full grid with a short search. The
+    layouts are identified by their canonical form (see
+    index.canonical), a layout seen before is not probed again.
+"""
+
+import sys
+import random
+from   argparse            import ArgumentParser
+from   sudokumaker.index   import canonical
+from   sudokumaker.Version import VERSION
+
+# The letters of the color map of sudoku_as_tex
+letters = 'rpvgoyldb'
+
+def _neighbours ():
+    """ Horizontal and vertical neighbours of each position """
+    result = []
+    for r in range (9):
+        for c in range (9):
+            n = []
+            for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                if 0 <= r + dr < 9 and 0 <= c + dc < 9:
+                    n.append (9 * (r + dr) + c + dc)
+            result.append (tuple (n))
+    return tuple (result)
+# end def _neighbours
+
+neighbours = _neighbours ()
+
+def connected (cells):
+    """ True if the set of positions cells is connected
+        >>> connected (set ((0, 1, 10)))
+        True
+        >>> connected (set ((0, 2)))
+        False
+    """
+    start = next (iter (cells))
+    seen  = set ((start,))
+    todo  = [start]
+    while todo:
+        for n in neighbours [todo.pop ()]:
+            if n in cells and n not in seen:
+                seen.add (n)
+                todo.append (n)
+    return len (seen) == len (cells)
+# end def connected
+
+# Flag for a filled tile in the candidate masks of full_grid
+filled = 1 << 15
+
+def full_grid (regions, maxnodes, rng = None):
+    """ Search for a full grid where each row, column and region (given
+        as region index per position) contains each number once.
+        Candidates are kept as bit masks, assigning a number removes it
+        from the peers, numbers possible in only one tile of a row,
+        column or region are assigned (hidden singles). Branching is on
+        the tile with the fewest candidates, in random order if a
+        random generator rng is given. Returns the grid as 81 bytes or
+        None if there is none or it was not found within maxnodes
+        assignments tried.
+        >>> quadrants = [3 * (p // 27) + p % 9 // 3 for p in range (81)]
+        >>> g = full_grid (quadrants, 100)
+        >>> ''.join (str (v) for v in g [:27])
+        '123456789456789123789123456'
+        >>> full_grid (quadrants, 10) is None
+        True
+    """
+    units = [[] for i in range (27)]
+    for p in range (81):
+        for u in (p // 9, 9 + p % 9, 18 + regions [p]):
+            units [u].append (p)
+    peers = [set () for p in range (81)]
+    for u in units:
+        for p in u:
+            peers [p].update (u)
+    peers = [tuple (s - set ((p,))) for p, s in enumerate (peers)]
+    nodes = [0]
+
+    def assign (cand, p, bit):
+        todo = [(p, bit)]
+        while todo:
+            p, bit = todo.pop ()
+            if cand [p] == bit | filled:
+                continue
+            cand [p] = bit | filled
+            for q in peers [p]:
+                c = cand [q]
+                if c & bit:
+                    c &= ~bit
+                    if c & filled or not c:
+                        return False
+                    cand [q] = c
+                    if not c & (c - 1):
+                        todo.append ((q, c))
+        return True
+    # end def assign
+
+    def hidden (cand):
+        changed = True
+        while changed:
+            changed = False
+            for u in units:
+                once = twice = done = 0
+                for p in u:
+                    c = cand [p]
+                    if c & filled:
+                        done  |= c
+                    else:
+                        twice |= once & c
+                        once  |= c
+                if (once | done) & 0x3fe != 0x3fe:
+                    return False
+                single = once & ~twice & ~done & 0x3fe
+                while single:
+                    bit = single & -single
+                    single ^= bit
+                    for p in u:
+                        if cand [p] & bit and not cand [p] & filled:
+                            if not assign (cand, p, bit):
+                                return False
+                            changed = True
+                            break
+        return True
+    # end def hidden
+
+    def search (cand):
+        if not hidden (cand):
+            return None
+        best = None
+        for p in range (81):
+            c = cand [p]
+            if not c & filled:
+                n = bin (c).count ('1')
+                if best is None or n < best [0]:
+                    best = (n, p)
+        if best is None:
+            return cand
+        p = best [1]
+        bits = [1 << i for i in range (1, 10) if cand [p] & (1 << i)]
+        if rng:
+            rng.shuffle (bits)
+        for bit in bits:
+            nodes [0] += 1
+            if nodes [0] > maxnodes:
+                return None
+            new = list (cand)
+            if assign (new, p, bit):
+                result = search (new)
+                if result is not None:
+                    return result
+        return None
+    # end def search
+
+    result = search ([0x3fe] * 81)
+    if result is None:
+        return None
+    return bytes ((c & ~filled).bit_length () - 1 for c in result)
+# end def full_grid
+
+def as_lines (regions):
+    """ Layout as nine lines of color letters
+        >>> as_lines ([p // 27 for p in range (81)]) [3]
+        'ppppppppp'
+    """
+    return \
+        [ ''.join (letters [regions [9 * r + c]] for c in range (9))
+          for r in range (9)
+        ]
+# end def as_lines
+
+class Layout_Generator:
+    """ Generate random feasible kikagaku layouts.
+        Each new layout is reached by steps moves from the last one.
+        A layout is feasible if a full grid is found by one of
+        restarts randomized searches of at most probe_nodes
+        assignments (see full_grid), layouts where all searches exceed
+        this budget are rejected, too. Search times for these layouts
+        are heavy-tailed, short restarts find a grid far more often
+        than one long search. The result of the probe is
+        cached by canonical form in cache.
+        >>> g = Layout_Generator (seed = 1, steps = 20)
+        >>> lay = g.layout ()
+        >>> sorted (''.join (lay)) == sorted (letters * 9)
+        True
+        >>> all (connected (c) for c in g.cells)
+        True
+        >>> len (g.cache) >= 1
+        True
+    """
+
+    def __init__ \
+        (self, seed = None, steps = 50, probe_nodes = 100, restarts = 20):
+        self.random      = random.Random (seed)
+        self.steps       = steps
+        self.probe_nodes = probe_nodes
+        self.restarts    = restarts
+        self.regions     = [3 * (r // 3) + c // 3 for r in range (9)
+                            for c in range (9)
+                           ]
+        self.cells       = [set () for i in range (9)]
+        for pos, reg in enumerate (self.regions):
+            self.cells [reg].add (pos)
+        self.cache       = {}
+        self.grid        = None
+        self.counters    = dict.fromkeys \
+            ( ('moves', 'disconnected', 'duplicate', 'infeasible', 'layouts')
+            , 0
+            )
+    # end def __init__
+
+    def splits (self, pos, region):
+        """ True if removing pos may disconnect region: This can only
+            happen if pos has more than one neighbour in region.
+        """
+        regions = self.regions
+        return sum (1 for n in neighbours [pos] if regions [n] == region) > 1
+    # end def splits
+
+    def move (self):
+        """ Try to move a random tile x into a neighbouring region b
+            and a tile z of b bordering on region a of x into a.
+            Returns True if the move was done.
+        """
+        regions = self.regions
+        x = self.random.randrange (81)
+        a = regions [x]
+        other = [n for n in neighbours [x] if regions [n] != a]
+        if not other:
+            return False
+        b = regions [self.random.choice (other)]
+        cand = \
+            [ z for z in self.cells [b]
+              if any (regions [n] == a and n != x for n in neighbours [z])
+            ]
+        if not cand:
+            return False
+        z = self.random.choice (cand)
+        # z borders on a without x, so a stays connected if removing x
+        # does not split it, same for b if x borders on b without z.
+        check_a = self.splits (x, a)
+        check_b = self.splits (z, b) or not any \
+            (regions [n] == b and n != z for n in neighbours [x])
+        self.cells [a].remove (x)
+        self.cells [b].remove (z)
+        self.cells [a].add (z)
+        self.cells [b].add (x)
+        regions [x], regions [z] = b, a
+        if  (  check_a and not connected (self.cells [a])
+            or check_b and not connected (self.cells [b])
+            ):
+            self.cells [a].remove (z)
+            self.cells [b].remove (x)
+            self.cells [a].add (x)
+            self.cells [b].add (z)
+            regions [x], regions [z] = a, b
+            self.counters ['disconnected'] += 1
+            return False
+        self.counters ['moves'] += 1
+        return True
+    # end def move
+
+    def feasible (self, regions):
+        """ Search for a full grid with this layout, the grid found is
+            kept in grid.
+            >>> g = Layout_Generator (seed = 1)
+            >>> g.feasible (g.regions)
+            True
+            >>> len (g.grid)
+            81
+        """
+        for n in range (self.restarts):
+            self.grid = full_grid (regions, self.probe_nodes, self.random)
+            if self.grid:
+                return True
+        return False
+    # end def feasible
+
+    def layout (self):
+        """ Next feasible layout not returned before, as nine lines of
+            color letters.
+        """
+        while True:
+            done = 0
+            while done < self.steps:
+                done += self.move ()
+            key = canonical (bytes (r + 1 for r in self.regions))
+            if key in self.cache:
+                self.counters ['duplicate'] += 1
+                continue
+            self.cache [key] = ok = self.feasible (self.regions)
+            if ok:
+                self.counters ['layouts'] += 1
+                return as_lines (self.regions)
+            self.counters ['infeasible'] += 1
+    # end def layout
+
+# end class Layout_Generator
+
+def main (argv = None):
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( "-n", "--number"
+        , dest    = "number"
+        , help    = "Number of layouts to generate, default=%(default)s"
+        , type    = int
+        , default = 1
+        )
+    cmd.add_argument \
+        ( "-p", "--probe-nodes"
+        , dest    = "probe_nodes"
+        , help    = "Budget in assignments of each search for a full grid,"
+                    " default=%(default)s"
+        , type    = int
+        , default = 100
+        )
+    cmd.add_argument \
+        ( "-R", "--restarts"
+        , dest    = "restarts"
+        , help    = "Number of searches for a full grid, default=%(default)s"
+        , type    = int
+        , default = 20
+        )
+    cmd.add_argument \
+        ( "-r", "--random-seed"
+        , dest    = "random_seed"
+        , help    = "Numeric random seed, default=%(default)s"
+        , type    = int
+        , default = 42
+        )
+    cmd.add_argument \
+        ( "-s", "--steps"
+        , dest    = "steps"
+        , help    = "Moves between two layouts, default=%(default)s"
+        , type    = int
+        , default = 50
+        )
+    cmd.add_argument \
+        ( "-V", "--verbose"
+        , dest    = "verbose"
+        , help    = "Print statistics to standard error"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-v", "--version"
+        , help    = "Display version"
+        , action  = "version"
+        , version = "%%(prog)s %s" % VERSION
+        )
+    args = cmd.parse_args (argv)
+    gen  = Layout_Generator \
+        (args.random_seed, args.steps, args.probe_nodes, args.restarts)
+    for n in range (args.number):
+        if n:
+            print ()
+        for r in range (9):
+            print ('0' * 9)
+        for line in gen.layout ():
+            print (line)
+    if args.verbose:
+        print \
+            ( ', '.join ('%s: %d' % kv for kv in gen.counters.items ())
+            , file = sys.stderr
+            )
+# end def main
+
+if __name__ == '__main__':
+    main (sys.argv [1:])
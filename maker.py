@@ -22,21 +22,69 @@
 
 from __future__ import print_function
 
+import os
 import sys
+import time
+import gzip
+import pickle
 import pga
-from sudokumaker.sudoku  import Puzzle
+from functools           import partial
+from sudokumaker.sudoku  import Puzzle, Alternatives
+from sudokumaker.grade   import grade
+from sudokumaker.index   import symmetries
 from sudokumaker.Version import VERSION
 from rsclib.autosuper    import autosuper
 from argparse            import ArgumentParser
 
 
 class Sudoku_Maker (pga.PGA, autosuper):
+    """ Genetic algorithm searching for puzzles with a unique solution
+        and as few givens as possible. If a band (low, high) of
+        difficulty ratings (see grade.Grade) is given, puzzles with a
+        unique solution are additionally penalized by the distance of
+        their rating from the band. Ratings are cached by genome in
+        the class-wide effort dict, alongside the evaluation cache.
+        If checkpoint is a filename, the state of the run is written
+        to it every checkpoint_interval generations, see
+        write_checkpoint. With resume the run continues from that
+        checkpoint, see load_checkpoint.
+        If an index (see index.Puzzle_Index) is given, unique puzzles
+        that are already in the index get the maximum band penalty.
+        With init 'grid' each individual of the initial population
+        is a random subset of a random valid full grid, each tile is
+        kept with probability density, see grid_init. The default
+        'random' gives each tile a random value in 0-9.
+        The generation and time of the first puzzle with a unique
+        solution is recorded in first_unique.
+        With operators 'sudoku' the mutation and crossover of PGApack
+        are replaced by sudoku_mutation and sudoku_crossover which
+        avoid repeated numbers in a row, column, etc. The number of
+        evaluations by outcome are counted in outcomes.
+        The evaluation is done in stages, see evaluate, the number of
+        evaluations decided in each stage are counted in stages.
+        If generations is given the run stops after that many
+        generations.
+    """
+
     def __init__ \
         ( self
         , srand            = 42
         , do_time          = False
         , colorconstrained = False
         , diagonal         = False
+        , memo_depth       = 2
+        , maxnodes         = None
+        , maxtime          = None
+        , band             = None
+        , checkpoint       = None
+        , checkpoint_interval = 10
+        , resume           = False
+        , index            = None
+        , init             = 'random'
+        , density          = 0.5
+        , operators        = 'default'
+        , stage_nodes      = 0
+        , generations      = None
         ):
         stop_on = \
             [ pga.PGA_STOP_NOCHANGE
@@ -46,6 +94,42 @@ class Sudoku_Maker (pga.PGA, autosuper):
         self.do_time          = do_time
         self.diagonal         = diagonal
         self.colorconstrained = colorconstrained
+        self.memo_depth       = memo_depth
+        self.maxnodes         = maxnodes
+        self.maxtime          = maxtime
+        self.band             = band
+        self.srand            = srand
+        self.checkpoint       = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.history          = []
+        self.resumed          = None
+        self.index            = index
+        self.init             = init
+        self.density          = density
+        self.first_unique     = None
+        self.positions        = range (9 * 9)
+        self.grids            = []
+        self.started          = time.time ()
+        self.operators        = operators
+        self.outcomes         = dict.fromkeys \
+            (('unique', 'multiple', 'unsolvable', 'exceeded'), 0)
+        self.stage_nodes      = stage_nodes
+        self.threshold        = None
+        self.stages           = dict.fromkeys \
+            ( ( 'repeated', 'propagation', 'missing', 'search'
+              , 'escalated'
+              )
+            , 0
+            )
+        self.init_peers ()
+        if init == 'grid':
+            self.initstring = self.grid_init
+        if operators == 'sudoku':
+            self.mutation  = self.sudoku_mutation
+            self.crossover = self.sudoku_crossover
+        kw = {}
+        if generations:
+            kw ['max_GA_iter'] = generations
         pga.PGA.__init__ \
             ( self
             , int # integer allele
@@ -58,51 +142,493 @@ class Sudoku_Maker (pga.PGA, autosuper):
             , print_options       = [pga.PGA_REPORT_STRING]
             , stopping_rule_types = stop_on
             , randomize_select    = True
+            , **kw
             )
         self.cache_hits = 0
+        if resume:
+            self.load_checkpoint ()
     # end def __init__
 
-    cache = {}
+    cache  = {}
+    effort = {}
+    # Penalty per rating point outside the band, the maximum penalty
+    # keeps unique puzzles better than any non-unique puzzle
+    band_weight  = 10
+    band_penalty = 800
+    # Number of different full grids for init 'grid'
+    grid_pool    = 50
+    # Probability that sudoku_mutation removes a given
+    remove_prob  = 0.6
+    # Fraction of the population for which the search budget is
+    # escalated, and the escalation factor
+    top_fraction = 0.2
+    escalation   = 10
 
     def endofgen (self):
         pop = pga.PGA_NEWPOP
         for p in range (self.pop_size):
             assert self.get_evaluation_up_to_date (p, pop)
-            puzzle, vals = self.phenotype (p, pop)
+            vals = self.genome (p, pop)
             if vals not in self.cache:
                 self.cache [vals] = self.get_evaluation (p, pop)
+        evals = sorted \
+            (self.get_evaluation (p, pop) for p in range (self.pop_size))
+        self.threshold = evals [int (self.top_fraction * (self.pop_size - 1))]
+        if self.resumed:
+            self.replay ()
+            return
+        self.history.append ((self.GA_iter, self.cache_hits, Puzzle.memo_hits))
+        if self.checkpoint and self.GA_iter % self.checkpoint_interval == 0:
+            self.write_checkpoint ()
     # end def endofgen
 
+    def parameters (self):
+        """ Parameters that must not change when resuming """
+        return dict \
+            ( srand            = self.srand
+            , colorconstrained = self.colorconstrained
+            , diagonal         = self.diagonal
+            , memo_depth       = self.memo_depth
+            , maxnodes         = self.maxnodes
+            , maxtime          = self.maxtime
+            , band             = self.band
+            , pop_size         = self.pop_size
+            , init             = self.init
+            , density          = self.density
+            , operators        = self.operators
+            )
+    # end def parameters
+
+    def init_peers (self):
+        """ For each position the positions that must not have the
+            same number (same row, column, quadrant and diagonal or
+            color if constrained), the positions of each of these
+            units, and the groups of positions that
+            sudoku_crossover exchanges: quadrants, bands of three rows
+            and stacks of three columns.
+        """
+        alt = Alternatives \
+            ( diagonal         = self.diagonal
+            , colorconstrained = self.colorconstrained
+            )
+        self.peers = []
+        units = sorted (set (u for us in alt.units.values () for u in us))
+        self.units = \
+            [ tuple (9 * t.row + t.col for t in alt.iterator (name) (idx))
+              for name, idx in units
+            ]
+        for r in range (9):
+            for c in range (9):
+                peers = set ()
+                for name, idx in alt.units [(r, c)]:
+                    peers.update \
+                        (9 * t.row + t.col for t in alt.iterator (name) (idx))
+                peers.discard (9 * r + c)
+                self.peers.append (tuple (sorted (peers)))
+        quadrants = \
+            [ [9 * t.row + t.col for t in alt.quadrant_iter ((r, c))]
+              for r in range (3) for c in range (3)
+            ]
+        bands  = [list (range (27 * b, 27 * b + 27)) for b in range (3)]
+        stacks = \
+            [ [9 * r + c for r in range (9) for c in range (3 * s, 3 * s + 3)]
+              for s in range (3)
+            ]
+        self.crossover_groups = (quadrants, bands, stacks)
+    # end def init_peers
+
+    def conflicts (self, vals, i):
+        """ True if the number at position i is repeated in a peer """
+        v = vals [i]
+        return any (vals [k] == v for k in self.peers [i])
+    # end def conflicts
+
+    def repair (self, vals):
+        """ Remove givens from vals (a bytearray) until no number is
+            repeated in a row, column, etc.
+        """
+        for i in self.positions:
+            if vals [i] and self.conflicts (vals, i):
+                vals [i] = 0
+    # end def repair
+
+    def sudoku_mutation (self, p, pop, pm):
+        """ Mutate each tile with probability pm: A given is removed
+            with probability remove_prob, otherwise the tile gets a
+            number not used by its peers. Returns the number of
+            mutations.
+        """
+        vals  = bytearray (self.genome (p, pop))
+        count = 0
+        for i in self.positions:
+            if not self.random_flip (pm):
+                continue
+            if vals [i] and self.random_flip (self.remove_prob):
+                vals [i] = 0
+            else:
+                used = set (vals [k] for k in self.peers [i])
+                free = [n for n in range (1, 10) if n not in used]
+                if vals [i] in free:
+                    free.remove (vals [i])
+                if not free:
+                    continue
+                vals [i] = free [self.random_interval (0, len (free) - 1)]
+            self.set_allele (p, pop, i, vals [i])
+            count += 1
+        return count
+    # end def sudoku_mutation
+
+    def sudoku_crossover (self, p1, p2, pop1, c1, c2, pop2):
+        """ Exchange whole quadrants, bands or stacks between the
+            parents, givens repeated in the children are removed.
+        """
+        a = bytearray (self.genome (p1, pop1))
+        b = bytearray (self.genome (p2, pop1))
+        groups = self.crossover_groups \
+            [self.random_interval (0, len (self.crossover_groups) - 1)]
+        for group in groups:
+            if self.random_flip (0.5):
+                for i in group:
+                    a [i], b [i] = b [i], a [i]
+        self.repair (a)
+        self.repair (b)
+        for i in self.positions:
+            self.set_allele (c1, pop2, i, a [i])
+            self.set_allele (c2, pop2, i, b [i])
+    # end def sudoku_crossover
+
+    def full_grid (self):
+        """ Random valid full grid for the constraints of the puzzle
+            as 81 bytes: Set a random tile with the fewest candidates
+            to a random candidate until all tiles are decided, start
+            over on a contradiction. Only the cheapest propagation is
+            used, restarting is faster than stronger rules. Uses the
+            random generator of the GA so that runs are reproducible.
+        """
+        while True:
+            alt = Alternatives \
+                ( diagonal         = self.diagonal
+                , colorconstrained = self.colorconstrained
+                , level            = 1
+                )
+            while alt.solvable:
+                tiles = [t for t in alt.tiles () if len (t) > 1]
+                if not tiles:
+                    return alt.as_bytes ()
+                tiles = [t for t in tiles if len (t) == len (tiles [0])]
+                t = tiles [self.random_interval (0, len (tiles) - 1)]
+                v = sorted (t)
+                v = v [self.random_interval (0, len (v) - 1)]
+                alt.set (t.row, t.col, v)
+    # end def full_grid
+
+    def grid_init (self, p, pop):
+        """ Initialize individual p from a random full grid. The
+            first grid_pool individuals get new grids, the others a
+            randomly renumbered, rotated or mirrored grid of the pool,
+            this keeps all constraints valid.
+        """
+        if len (self.grids) < self.grid_pool:
+            grid = self.full_grid ()
+            self.grids.append (grid)
+        else:
+            grid = self.grids [self.random_interval (0, self.grid_pool - 1)]
+            perm = [0]
+            while len (perm) < 10:
+                n = self.random_interval (1, 9)
+                if n not in perm:
+                    perm.append (n)
+            sym  = symmetries [self.random_interval (0, len (symmetries) - 1)]
+            grid = bytes (perm [grid [i]] for i in sym)
+        for i in self.positions:
+            v = grid [i] if self.random_flip (self.density) else 0
+            self.set_allele (p, pop, i, v)
+    # end def grid_init
+
+    def write_checkpoint (self):
+        """ Write generation, population genomes with their
+            evaluations, the counters of each generation and the
+            evaluation cache, ratings and solver memo to the checkpoint
+            file. The file is written under a temporary name and
+            renamed, so a crash leaves the previous checkpoint intact.
+        """
+        pop   = pga.PGA_NEWPOP
+        state = dict \
+            ( parameters  = self.parameters ()
+            , generation  = self.GA_iter
+            , population  =
+                [self.genome (p, pop) for p in range (self.pop_size)]
+            , evaluations =
+                [self.get_evaluation (p, pop) for p in range (self.pop_size)]
+            , history     = self.history
+            , cache       = self.cache
+            , effort      = self.effort
+            , memo        = Puzzle.memo
+            )
+        tmp = self.checkpoint + '.tmp'
+        with open (tmp, 'wb') as f:
+            with gzip.GzipFile (fileobj = f, mode = 'wb') as z:
+                pickle.dump (state, z, pickle.HIGHEST_PROTOCOL)
+            f.flush ()
+            os.fsync (f.fileno ())
+        os.replace (tmp, self.checkpoint)
+    # end def write_checkpoint
+
+    def load_checkpoint (self):
+        """ Resume from the checkpoint file. The random generator of
+            the GA library cannot be saved, so the run is repeated from
+            generation 0 with the same seed. All genomes evaluated up
+            to the checkpoint are in the restored cache, so this does
+            not repeat the solver work. Until the checkpoint is reached
+            the counters are reset to their recorded values (see
+            replay) so the output is the same as for an uninterrupted
+            run.
+        """
+        with gzip.open (self.checkpoint, 'rb') as f:
+            state = pickle.load (f)
+        if state ['parameters'] != self.parameters ():
+            raise ValueError \
+                ( "Checkpoint %s was written with different parameters: %s"
+                % (self.checkpoint, state ['parameters'])
+                )
+        self.cache.update  (state ['cache'])
+        self.effort.update (state ['effort'])
+        Puzzle.memo.update (state ['memo'])
+        self.resumed = state
+    # end def load_checkpoint
+
+    def replay (self):
+        """ Called at the end of a generation that was already run
+            before the checkpoint was written: Restore the counters
+            of that generation. At the checkpoint generation the
+            population must be the same as in the checkpoint.
+        """
+        state = self.resumed
+        gen   = self.GA_iter
+        entry = state ['history'] [len (self.history)]
+        assert entry [0] == gen
+        self.history.append (entry)
+        self.cache_hits, Puzzle.memo_hits = entry [1:]
+        if gen < state ['generation']:
+            return
+        pop = pga.PGA_NEWPOP
+        if  (  [self.genome (p, pop) for p in range (self.pop_size)]
+            != state ['population']
+            ):
+            raise ValueError \
+                ("Population differs from checkpoint at generation %d" % gen)
+        self.resumed = None
+    # end def replay
+
     def evaluate (self, p, pop):
         puzzle, vals = self.phenotype (p, pop)
-        puzzle.solve ()
-        if puzzle.solvecount:
+        return self.score (puzzle, vals)
+    # end def evaluate
+
+    def score (self, puzzle, vals):
+        """ Unique solution: number of givens (plus the penalty for
+            missing the difficulty band), multiple solutions:
+            around 1000, budget exceeded: 1500 + number of givens,
+            no solution: 1000 * givens ** 2
+            The cheap stages come first: A number repeated in a row,
+            column, etc. (see repeated) or a contradiction found by
+            propagation means no solution. If five or more numbers
+            do not occur at all, a solvable puzzle has at least 5! > 50
+            solutions (the missing numbers can be permuted), so we only
+            need to find one. Otherwise we search, by default with the
+            full budget maxnodes. With stage_nodes the search starts
+            with a budget of stage_nodes branch points (see budgets).
+            The budget is escalated only if the puzzle could still get
+            into the best top_fraction of the last generation, i.e., if
+            its score with a unique solution (the number of givens) is
+            not worse than the threshold computed in endofgen. In the
+            first generation there is no threshold and we always
+            escalate. A puzzle stopped early gets the score of an
+            exceeded budget, it may be ranked below puzzles with
+            multiple solutions, so the stages are opt-in.
+            >>> m = Sudoku_Maker (stage_nodes = 10)
+            >>> def sc (s):
+            ...     vals = bytes (0 if c == '.' else int (c) for c in s)
+            ...     p = Puzzle.from_bytes \\
+            ...         (vals, verbose = False, solvemax = 50)
+            ...     return m.score (p, vals)
+            >>> sc ('11' + '.' * 79)
+            4000
+            >>> sc ('3..7.48....1...2..2...5....4.7.9....'
+            ...     + '.1.....8.6....89..1......5..5....7.6....69..2')
+            576000
+            >>> sc ('1234' + '.' * 77)
+            1046
+            >>> hard = '1....7.9..3..2...8..96..5....53..9...1..8...26' \\
+            ...      + '....4...3......1..4......7..7...3..'
+            >>> sc (hard)
+            23
+            >>> m.threshold = 20
+            >>> sc (hard)
+            1523
+            >>> m.threshold = 30
+            >>> sc (hard)
+            23
+            >>> for k in m.stages:
+            ...     print (k, m.stages [k])
+            repeated 1
+            propagation 1
+            missing 1
+            search 3
+            escalated 2
+            >>> m.outcomes
+            {'unique': 2, 'multiple': 1, 'unsolvable': 2, 'exceeded': 1}
+        """
+        count = puzzle.count
+        if self.repeated (vals):
+            self.stages ['repeated'] += 1
+            self.outcomes ['unsolvable'] += 1
+            return 1000 * count * count
+        alt = Alternatives \
+            ( puzzle.puzzle
+            , diagonal         = self.diagonal
+            , colorconstrained = self.colorconstrained
+            )
+        if not alt.solvable:
+            self.stages ['propagation'] += 1
+            self.outcomes ['unsolvable'] += 1
+            return 1000 * count * count
+        if len (set (vals) - set ((0,))) <= 4:
+            puzzle.solvemax = 1
+            puzzle.solve (alt)
+            if not puzzle.exceeded:
+                self.stages ['missing'] += 1
+                if puzzle.solvecount:
+                    self.outcomes ['multiple'] += 1
+                    return 1000 - count + 50
+                self.outcomes ['unsolvable'] += 1
+                return 1000 * count * count
+            puzzle.solvemax = 50
+        self.stages ['search'] += 1
+        for budget in self.budgets ():
+            puzzle.maxnodes = budget
+            puzzle.solve (alt)
+            if not puzzle.exceeded or budget == self.maxnodes:
+                break
+            if self.threshold is not None and count > self.threshold:
+                break
+            self.stages ['escalated'] += 1
+        if puzzle.exceeded:
+            self.outcomes ['exceeded'] += 1
+            eval = 1500 + count
+        elif puzzle.solvecount:
             if puzzle.solvecount == 1:
-                eval = puzzle.count
+                self.outcomes ['unique'] += 1
+                if self.first_unique is None:
+                    self.first_unique = \
+                        (self.GA_iter, time.time () - self.started)
+                if self.duplicate (vals):
+                    eval = count + self.band_penalty
+                else:
+                    eval = count + self.band_distance (puzzle, vals)
             else:
-                eval = 1000 - puzzle.count + puzzle.solvecount
+                self.outcomes ['multiple'] += 1
+                eval = 1000 - count + puzzle.solvecount
         else:
-            eval = 1000 * puzzle.count * puzzle.count
+            self.outcomes ['unsolvable'] += 1
+            eval = 1000 * count * count
         return eval
-    # end def evaluate
+    # end def score
+
+    def budgets (self):
+        """ Escalating node budgets for the search: stage_nodes
+            multiplied by escalation up to maxnodes (None if the search
+            is not limited). With stage_nodes 0 there is only one
+            search with maxnodes.
+            >>> class M: stage_nodes, escalation, maxnodes = 1000, 10, None
+            >>> Sudoku_Maker.budgets (M ())
+            [1000, 10000, 100000, None]
+            >>> M.maxnodes = 5000
+            >>> Sudoku_Maker.budgets (M ())
+            [1000, 5000]
+        """
+        result = []
+        budget = self.stage_nodes
+        while budget and len (result) < 3:
+            if self.maxnodes is not None and budget >= self.maxnodes:
+                break
+            result.append (budget)
+            budget *= self.escalation
+        result.append (self.maxnodes)
+        return result
+    # end def budgets
+
+    def repeated (self, vals):
+        """ True if a number is repeated in a row, column, etc. """
+        for unit in self.units:
+            seen = 0
+            for i in unit:
+                v = vals [i]
+                if v:
+                    bit = 1 << v
+                    if seen & bit:
+                        return True
+                    seen |= bit
+        return False
+    # end def repeated
+
+    def band_distance (self, puzzle, vals):
+        """ Penalty for the distance of the rating from the band """
+        if not self.band:
+            return 0
+        rating = self.rating (puzzle, vals)
+        low, high = self.band
+        d = max (0, low - rating, rating - high)
+        return min (int (round (self.band_weight * d)), self.band_penalty)
+    # end def band_distance
+
+    def duplicate (self, vals):
+        """ True if the puzzle vals is already in the index """
+        if self.index is None:
+            return False
+        return self.index_key (vals) in self.index
+    # end def duplicate
+
+    def index_key (self, vals):
+        return self.index.key \
+            ( vals
+            , diagonal         = self.diagonal
+            , colorconstrained = self.colorconstrained
+            )
+    # end def index_key
+
+    def rating (self, puzzle, vals):
+        """ Difficulty rating of puzzle, cached by genome """
+        g = self.effort.get (vals)
+        if g is None:
+            g = self.effort [vals] = grade (puzzle, self.maxnodes)
+        return g.rating
+    # end def rating
+
+    def genome (self, p, pop):
+        """ Read the whole chromosome of individual p in one go and
+            return it as 81 bytes. Alleles outside 0-9 are empty tiles.
+            The result is used as the cache key.
+        """
+        vals = list (map (partial (self.get_allele, p, pop), self.positions))
+        if min (vals) < 0 or max (vals) > 9:
+            vals = [v if 0 <= v <= 9 else 0 for v in vals]
+        return bytes (vals)
+    # end def genome
 
     def phenotype (self, p, pop):
-        puzzle = Puzzle \
-            ( verbose          = False
+        vals   = self.genome (p, pop)
+        puzzle = Puzzle.from_bytes \
+            ( vals
+            , verbose          = False
             , solvemax         = 50
             , do_time          = self.do_time
             , colorconstrained = self.colorconstrained
             , diagonal         = self.diagonal
+            , memo_depth       = self.memo_depth
+            , maxnodes         = self.maxnodes
+            , maxtime          = self.maxtime
             )
-        vals   = []
-        for x in range (9):
-            for y in range (9):
-                val    = self.get_allele (p, pop, 9 * x + y)
-                if val > 9:
-                    val = 0
-                puzzle.set (x, y, val)
-                vals.append (val)
-        vals = tuple (vals)
         return puzzle, vals
     # end def phenotype
 
@@ -110,7 +636,7 @@ class Sudoku_Maker (pga.PGA, autosuper):
         for p in range (self.pop_size):
             if self.get_evaluation_up_to_date (p, pop):
                 continue
-            puzzle, vals = self.phenotype (p, pop)
+            vals = self.genome (p, pop)
             if vals in self.cache:
                 self.set_evaluation (p, pop, self.cache [vals])
                 self.set_evaluation_up_to_date (p, pop, True)
@@ -120,22 +646,35 @@ class Sudoku_Maker (pga.PGA, autosuper):
     def print_string (self, file, p, pop):
         self.file = file
         print ('Cache hits: %d' % self.cache_hits, file = file)
+        print ('Memo hits: %d'  % Puzzle.memo_hits, file = file)
         assert self.get_evaluation_up_to_date (p, pop)
         puzzle, vals = self.phenotype (p, pop)
         e = self.get_evaluation (p, pop)
         if e >= 2000:
             assert puzzle.count * puzzle.count * 1000 == e
             solvecount = 0
-        elif e > 81:
+        elif e >= 1500:
+            assert e == 1500 + puzzle.count
+            print ('Budget exceeded', file = file)
+            solvecount = 0
+        elif e > 81 + self.band_penalty:
             solvecount = int (e - 1000 + puzzle.count)
             assert solvecount == e - 1000 + puzzle.count
         else:
-            assert e == puzzle.count
+            assert e >= puzzle.count
             solvecount = 1
         print \
             ( 'Non-empty tiles: %d, solvecount: %d' % (puzzle.count, solvecount)
             , file = file
             )
+        if solvecount == 1 and self.duplicate (vals):
+            print ('Duplicate: already in index', file = file)
+        elif self.band and solvecount == 1:
+            print \
+                ( 'Rating: %.2f (%s)'
+                % (self.rating (puzzle, vals), self.effort [vals].tier)
+                , file = file
+                )
         puzzle.display (file)
         self.file.flush ()
     # end def print_string
@@ -144,6 +683,18 @@ class Sudoku_Maker (pga.PGA, autosuper):
 
 def main ():
     cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( "-C", "--checkpoint"
+        , dest    = "checkpoint"
+        , help    = "Write a checkpoint of the run to this file"
+        )
+    cmd.add_argument \
+        ( "--checkpoint-interval"
+        , dest    = "checkpoint_interval"
+        , help    = "Generations between checkpoints, default=%(default)s"
+        , type    = int
+        , default = 10
+        )
     cmd.add_argument \
         ( "-c", "--colorconstrained"
         , dest    = "colorconstrained"
@@ -156,6 +707,75 @@ def main ():
         , help    = "Add diagonality constraint"
         , action  = "store_true"
         )
+    cmd.add_argument \
+        ( "-G", "--generations"
+        , dest    = "generations"
+        , help    = "Stop after this number of generations"
+        , type    = int
+        )
+    cmd.add_argument \
+        ( "-g", "--grade-band"
+        , dest    = "band"
+        , help    = "Search puzzles with a difficulty rating in this band,"
+                    " e.g. 2 2 for medium puzzles (1 easy, 2 medium,"
+                    " 3 hard, 4 and above need search)"
+        , type    = float
+        , nargs   = 2
+        , metavar = ('LOW', 'HIGH')
+        )
+    cmd.add_argument \
+        ( "-D", "--density"
+        , dest    = "density"
+        , help    = "Fraction of tiles kept from the full grid with"
+                    " --init=grid, default=%(default)s"
+        , type    = float
+        , default = 0.5
+        )
+    cmd.add_argument \
+        ( "-i", "--init"
+        , dest    = "init"
+        , help    = "Initialization of the population: 'random' values"
+                    " or subsets of valid full 'grid's, default=%(default)s"
+        , choices = ('random', 'grid')
+        , default = 'random'
+        )
+    cmd.add_argument \
+        ( "-I", "--index"
+        , dest    = "index"
+        , help    = "Directory of an index of earlier puzzles (see"
+                    " sudoku_index), puzzles in the index are avoided"
+                    " and the result is added"
+        )
+    cmd.add_argument \
+        ( "-n", "--maxnodes"
+        , dest    = "maxnodes"
+        , help    = "Search budget: maximum number of branch points"
+        , type    = int
+        )
+    cmd.add_argument \
+        ( "-O", "--operators"
+        , dest    = "operators"
+        , help    = "Mutation and crossover: 'default' of PGApack or"
+                    " 'sudoku' avoiding repeated numbers,"
+                    " default=%(default)s"
+        , choices = ('default', 'sudoku')
+        , default = 'default'
+        )
+    cmd.add_argument \
+        ( "-P", "--profile"
+        , dest    = "profile"
+        , help    = "Profile evaluation and solver and write the result to"
+                    " this file, Chrome trace events if the name ends in"
+                    " .json, collapsed stacks for flamegraph.pl otherwise"
+        )
+    cmd.add_argument \
+        ( "--profile-sample"
+        , dest    = "profile_sample"
+        , help    = "Time only every n-th call of each profiled method,"
+                    " default=%(default)s"
+        , type    = int
+        , default = 1
+        )
     cmd.add_argument \
         ( "-r", "--random-seed"
         , dest    = "random_seed"
@@ -163,12 +783,33 @@ def main ():
         , type    = int
         , default = 42
         )
+    cmd.add_argument \
+        ( "-R", "--resume"
+        , dest    = "resume"
+        , help    = "Continue the run from the checkpoint file"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-S", "--stage-nodes"
+        , dest    = "stage_nodes"
+        , help    = "Search budget in branch points of the first stage,"
+                    " escalated for the best puzzles, 0 searches without"
+                    " stages (the default)"
+        , type    = int
+        , default = 0
+        )
     cmd.add_argument \
         ( "-t", "--time"
         , dest    = "do_time"
         , help    = "Runtime measurement"
         , action  = "store_true"
         )
+    cmd.add_argument \
+        ( "-T", "--maxtime"
+        , dest    = "maxtime"
+        , help    = "Search budget: maximum time in seconds per evaluation"
+        , type    = float
+        )
     cmd.add_argument \
         ( "-v", "--version"
         , help    = "Display version"
@@ -176,13 +817,72 @@ def main ():
         , version = "%%(prog)s %s" % VERSION
         )
     args = cmd.parse_args ()
-    maker = Sudoku_Maker \
-        ( srand            = args.random_seed
-        , do_time          = args.do_time
-        , colorconstrained = args.colorconstrained
-        , diagonal         = args.diagonal
-        )
+    if args.resume:
+        if not args.checkpoint:
+            cmd.error ("--resume needs a checkpoint file (-C)")
+        if not os.path.exists (args.checkpoint):
+            cmd.error ("Checkpoint %s not found" % args.checkpoint)
+    index = None
+    if args.index:
+        from sudokumaker.index import Puzzle_Index
+        index = Puzzle_Index (args.index)
+    try:
+        maker = Sudoku_Maker \
+            ( srand               = args.random_seed
+            , do_time             = args.do_time
+            , colorconstrained    = args.colorconstrained
+            , diagonal            = args.diagonal
+            , maxnodes            = args.maxnodes
+            , maxtime             = args.maxtime
+            , band                = args.band
+            , checkpoint          = args.checkpoint
+            , checkpoint_interval = args.checkpoint_interval
+            , resume              = args.resume
+            , index               = index
+            , init                = args.init
+            , density             = args.density
+            , operators           = args.operators
+            , stage_nodes         = args.stage_nodes
+            , generations         = args.generations
+            )
+    except ValueError as err:
+        cmd.error (str (err))
+    if args.profile:
+        from sudokumaker.profiler import Profiler, solver_spans
+        profiler = Profiler (args.profile_sample)
+        profiler.enable \
+            (solver_spans
+                ( extra =
+                    ( (Sudoku_Maker, 'pre_eval')
+                    , (Sudoku_Maker, 'evaluate')
+                    , (Sudoku_Maker, 'endofgen')
+                    )
+                )
+            )
     maker.run ()
+    if args.profile:
+        profiler.disable ()
+        profiler.write (args.profile)
+    if maker.first_unique:
+        print \
+            ( "First unique puzzle in generation %d after %.2f seconds"
+            % maker.first_unique
+            )
+    print \
+        ( "Evaluations: %s"
+        % ', '.join ('%s: %d' % kv for kv in maker.outcomes.items ())
+        )
+    print \
+        ( "Stages: %s"
+        % ', '.join ('%s: %d' % kv for kv in maker.stages.items ())
+        )
+    if index is not None:
+        pop  = pga.PGA_OLDPOP
+        best = maker.get_best_index (pop)
+        vals = maker.genome (best, pop)
+        if maker.get_evaluation (best, pop) <= 81 + maker.band_penalty:
+            index.add (maker.index_key (vals))
+        index.close ()
 
 if __name__ == "__main__":
     main ()
@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+# Copyright (C) 2005-2022 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+# ****************************************************************************
+
+from   __future__ import print_function
+import time
+import multiprocessing
+from   concurrent.futures  import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from   sudokumaker.sudoku  import Puzzle, Alternatives
+
+# Shared solution counter and limit, set in each worker process
+counter  = None
+solvemax = None
+
+def init_worker (shared_counter, limit):
+    global counter, solvemax
+    counter  = shared_counter
+    solvemax = limit
+# end def init_worker
+
+def count_solution ():
+    """ Reserve a slot in the shared solution counter.
+        Returns False if solvemax is already reached.
+    """
+    with counter.get_lock ():
+        if counter.value >= solvemax:
+            return False
+        counter.value += 1
+        return True
+# end def count_solution
+
+def solve_subproblem (task):
+    """ Depth-first search of the subproblem given by a packed
+        candidate state. If more than budget nodes are expanded, the
+        search stops and the still open nodes are returned as new
+        subproblems so that they can be distributed to other workers.
+        Returns found solutions, open states and the number of nodes.
+    """
+    state, kw, budget = task
+    stack     = [Alternatives.from_state (state, **kw)]
+    solutions = []
+    nodes     = 0
+    while stack:
+        if counter.value >= solvemax:
+            return solutions, [], nodes
+        alt = stack.pop ()
+        if not alt.solvable:
+            continue
+        tile = alt.branch_tile ()
+        if tile is None:
+            if not count_solution ():
+                return solutions, [], nodes
+            solutions.append (alt.as_bytes ())
+            continue
+        if nodes >= budget:
+            stack.append (alt)
+            break
+        nodes += 1
+        stack.extend (reversed (list (alt.children (tile))))
+    return solutions, [a.state () for a in stack if a.solvable], nodes
+# end def solve_subproblem
+
+class Parallel_Puzzle (Puzzle):
+    """ Puzzle with a work-splitting parallel search.
+        The search tree is expanded breadth-first until there are
+        enough independent subproblems, these are solved on a process
+        pool. Subproblems are passed as packed candidate states (see
+        Alternatives.state). A worker that exceeds its node budget
+        returns its open nodes which are then re-distributed. All
+        workers share a solution counter and stop when solvemax is
+        reached. The number (and if solvemax is not reached the set) of
+        solutions is the same as for the sequential search, solutions
+        are displayed sorted after the search is finished.
+        The search budgets of Puzzle (maxnodes, maxsteps, maxtime),
+        learn and restarts are not supported, nodes counts the branch
+        points of all workers.
+        >>> Parallel_Puzzle (maxnodes = 5)
+        Traceback (most recent call last):
+        ...
+        ValueError: Not supported by the parallel search: maxnodes
+    """
+
+    def __init__ (self, jobs = None, split = 4, budget = 2000, **kw):
+        unsupported = \
+            [ k for k in
+                ('maxnodes', 'maxsteps', 'maxtime', 'learn', 'restarts')
+              if kw.get (k)
+            ]
+        if unsupported:
+            raise ValueError \
+                ( "Not supported by the parallel search: %s"
+                % ', '.join (unsupported)
+                )
+        Puzzle.__init__ (self, **kw)
+        self.jobs   = jobs or multiprocessing.cpu_count ()
+        self.split  = split
+        self.budget = budget
+    # end def __init__
+
+    def alternatives_args (self):
+        return dict \
+            ( diagonal         = self.diagonal
+            , colorconstrained = self.colorconstrained
+            , kikagaku         = self.kikagaku
+            , cages            = self.cages
+            )
+    # end def alternatives_args
+
+    def frontier (self, alt):
+        """ Breadth-first expansion of alt until we have at least
+            split * jobs open nodes. Solutions found during expansion
+            are appended to self.solutions.
+        """
+        nodes = [alt]
+        while nodes and len (nodes) < self.split * self.jobs:
+            expand = []
+            for a in nodes:
+                if not a.solvable:
+                    continue
+                tile = a.branch_tile ()
+                if tile is None:
+                    if len (self.solutions) < self.solvemax:
+                        self.solutions.append (a.as_bytes ())
+                    continue
+                self.nodes += 1
+                expand.extend (a.children (tile))
+            nodes = expand
+        return [a.state () for a in nodes if a.solvable]
+    # end def frontier
+
+    def solve (self):
+        self.solvecount = 0
+        self.solutions  = []
+        self.nodes      = 0
+        self.steps      = 0
+        self.exceeded   = None
+        if self.do_time:
+            before = time.time ()
+        kw  = self.alternatives_args ()
+        alt = Alternatives (self.puzzle, **kw)
+        states = self.frontier (alt)
+        shared = multiprocessing.Value ('i', len (self.solutions))
+        if states and len (self.solutions) < self.solvemax:
+            self.run_pool (states, kw, shared)
+        self.solvecount = len (self.solutions)
+        if self.do_time:
+            self.runtime = time.time () - before
+        if self.verbose:
+            puzzle = self.puzzle
+            for n, s in enumerate (sorted (self.solutions)):
+                print ("Solved (%s):" % (n + 1))
+                self.puzzle = Puzzle.from_bytes (s).puzzle
+                self.display ()
+            self.puzzle = puzzle
+            if self.solvecount >= self.solvemax:
+                print ("Max. solutions (%d) reached" % self.solvemax)
+            print ("No (more) solutions")
+            if self.do_time:
+                print ("runtime: %s" % self.runtime)
+    # end def solve
+
+    def run_pool (self, states, kw, shared):
+        with ProcessPoolExecutor \
+            ( max_workers = self.jobs
+            , initializer = init_worker
+            , initargs    = (shared, self.solvemax)
+            ) as pool:
+            running = set \
+                (pool.submit (solve_subproblem, (s, kw, self.budget))
+                 for s in states
+                )
+            while running:
+                done, running = wait (running, return_when = FIRST_COMPLETED)
+                for f in done:
+                    solutions, open_states, nodes = f.result ()
+                    self.solutions.extend (solutions)
+                    self.nodes += nodes
+                    for s in open_states:
+                        running.add \
+                            (pool.submit
+                                (solve_subproblem, (s, kw, self.budget))
+                            )
+                if shared.value >= self.solvemax:
+                    for f in running:
+                        f.cancel ()
+                    for f in running:
+                        if not f.cancelled ():
+                            self.solutions.extend (f.result () [0])
+                    running = set ()
+    # end def run_pool
+
+# end class Parallel_Puzzle
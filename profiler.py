@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+# Copyright (C) 2005-2022 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+# ****************************************************************************
+
+""" Opt-in profiling of the solver hot path.
+    Profiler.enable replaces the methods given as spans by timing
+    wrappers, disable restores the originals, so there is no cost when
+    profiling is off. Only every sample-th call of each method is
+    timed, the times are scaled by sample. The result is written
+    either as Chrome trace events (JSON, for chrome://tracing or
+    Perfetto) or as collapsed stacks for flamegraph.pl, with the self
+    time of each stack in microseconds.
+"""
+
+import json
+from   time                import perf_counter
+from   functools           import wraps
+
+# Methods of the solver hot path, as (class name, method name)
+hot_path = \
+    ( ('Puzzle',       'solve')
+    , ('Puzzle',       '_search')
+    , ('Alternatives', 'copy')
+    , ('Alternatives', 'set')
+    , ('Alternatives', 'update')
+    , ('Alternatives', 'invert')
+    , ('Alternatives', 'invert_sets')
+    , ('Alternatives', 'cage_check')
+    , ('Alternatives', 'tiles')
+    )
+
+class Profiler:
+    """ Timing spans per method.
+        >>> class A:
+        ...     def f (self):
+        ...         return self.g () + 1
+        ...     def g (self):
+        ...         return 1
+        >>> p = Profiler ()
+        >>> p.enable ([(A, 'f'), (A, 'g')])
+        >>> A ().f ()
+        2
+        >>> p.disable ()
+        >>> sorted (p.inclusive)
+        [('A.f',), ('A.f', 'A.g')]
+        >>> [e [0] for e in p.events]
+        ['A.g', 'A.f']
+        >>> hasattr (A.f, '__wrapped__')
+        False
+    """
+
+    def __init__ (self, sample = 1, max_events = 1000000):
+        self.sample     = sample
+        self.max_events = max_events
+        self.stack      = []
+        self.inclusive  = {}
+        self.events     = []
+        self.patched    = []
+        self.start      = perf_counter ()
+    # end def __init__
+
+    def wrap (self, cls, name):
+        orig    = cls.__dict__ [name]
+        span    = '%s.%s' % (cls.__name__, name)
+        stack   = self.stack
+        counter = [0]
+        @wraps (orig)
+        def wrapper (*args, **kw):
+            stack.append (span)
+            counter [0] += 1
+            if counter [0] % self.sample:
+                try:
+                    return orig (*args, **kw)
+                finally:
+                    stack.pop ()
+            t = perf_counter ()
+            try:
+                return orig (*args, **kw)
+            finally:
+                d   = perf_counter () - t
+                key = tuple (stack)
+                self.inclusive [key] = \
+                    self.inclusive.get (key, 0) + d * self.sample
+                if len (self.events) < self.max_events:
+                    self.events.append ((span, t, d))
+                stack.pop ()
+        setattr (cls, name, wrapper)
+        self.patched.append ((cls, name, orig))
+    # end def wrap
+
+    def enable (self, spans):
+        """ Wrap methods, spans are (class, method name) tuples """
+        for cls, name in spans:
+            self.wrap (cls, name)
+    # end def enable
+
+    def disable (self):
+        """ Restore the original methods """
+        for cls, name, orig in reversed (self.patched):
+            setattr (cls, name, orig)
+        self.patched = []
+    # end def disable
+
+    def self_times (self):
+        """ Self time by stack: inclusive time minus the inclusive
+            time of direct children. Since children are sampled
+            independently, this is an estimate, negative values are
+            set to 0.
+        """
+        result = dict (self.inclusive)
+        for key, t in self.inclusive.items ():
+            parent = key [:-1]
+            if parent in result:
+                result [parent] -= t
+        return dict ((k, max (0, t)) for k, t in result.items ())
+    # end def self_times
+
+    def write_collapsed (self, file):
+        """ One line per stack: frames separated by ';' and the self
+            time in microseconds, the input format of flamegraph.pl
+        """
+        for key, t in sorted (self.self_times ().items ()):
+            file.write ('%s %d\n' % (';'.join (key), round (t * 1e6)))
+    # end def write_collapsed
+
+    def write_trace (self, file):
+        """ Chrome trace event format, complete events in microseconds
+        """
+        events = \
+            [ dict
+                ( name = name
+                , ph   = 'X'
+                , ts   = (t - self.start) * 1e6
+                , dur  = d * 1e6
+                , pid  = 1
+                , tid  = 1
+                )
+              for name, t, d in self.events
+            ]
+        json.dump (dict (traceEvents = events, displayTimeUnit = 'ms'), file)
+    # end def write_trace
+
+    def write (self, filename):
+        """ Write trace if filename ends in .json, else collapsed """
+        with open (filename, 'w') as f:
+            if filename.endswith ('.json'):
+                self.write_trace (f)
+            else:
+                self.write_collapsed (f)
+    # end def write
+
+# end class Profiler
+
+def solver_spans (classes = None, extra = ()):
+    """ The (class, method) tuples of the hot path plus extra, classes
+        maps class names to classes, default are the classes of the
+        sudoku module (this differs when it runs as a script).
+    """
+    if classes is None:
+        from sudokumaker import sudoku
+        classes = vars (sudoku)
+    spans = [(classes [c], m) for c, m in hot_path]
+    return spans + list (extra)
+# end def solver_spans
@@ -0,0 +1,488 @@
+#!/usr/bin/python3
+# Copyright (C) 2005-2022 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+# ****************************************************************************
+
+""" Renderers for puzzles.
+    A renderer compiles a template for each variant and layout of a
+    puzzle (diagonal, color-constrained, kikagaku layout) once and
+    caches it. Rendering a puzzle then only substitutes the 81 digits
+    into the template. Output of a batch of puzzles is collected in a
+    buffer and written in chunks, so that a batch can be streamed from
+    a generator of puzzles.
+    Renderers are registered by name in the renderers dict, see
+    register. Available are text (as printed by the solver), tex, svg
+    and json (one JSON object per line).
+"""
+
+import sys
+import time
+
+# Colors used for color-constrained and kikagaku puzzles, yellow and
+# white are predefined in TeX.
+html_colors = \
+    ( ('sred',    'FAB3BA')
+    , ('sviolet', 'EDD4FF')
+    , ('sgrey',   'DFDDD8')
+    , ('sorange', 'F3CE82')
+    , ('spink',   'F1A1DC')
+    , ('syellow', 'F6FC7B')
+    , ('slgreen', 'C8FBAE')
+    , ('sdgreen', '99EECD')
+    , ('sblue',   'A4DFF2')
+    )
+svg_colors = dict (html_colors, yellow = 'FFFF00', white = 'FFFFFF')
+
+# TeX output
+
+tex_preamble = r"""\documentclass[12pt]{article}
+\usepackage{xcolor}
+\newlength{\w}
+\setlength{\fboxsep}{0pt}
+"""
+
+tex_color_defs = ''.join \
+    ('\\definecolor{%s}{HTML}{%s}\n' % c for c in html_colors)
+
+tex_title = r"""\date{%s}
+\author{%s}
+\title{%s}
+\begin{document}
+\maketitle
+\thispagestyle{empty}
+"""
+
+tex_table_head = r"""\begin{tabular}%
+ {@{}|@{}p{\w}@{}|@{}p{\w}@{}|@{}p{\w}@{}|
+     |@{}p{\w}@{}|@{}p{\w}@{}|@{}p{\w}@{}|
+     |@{}p{\w}@{}|@{}p{\w}@{}|@{}p{\w}@{}|@{}}
+"""
+
+tex_cell = r"\colorbox{%s}{\hbox to\w{\hfil\strut %s\hfil}}"
+
+# Colors of the positions in a quadrant for color-constrained sudokus
+quadrant_colors = \
+    [ ['sred',    'spink',   'sviolet']
+    , ['sgrey',   'sorange', 'syellow']
+    , ['slgreen', 'sdgreen', 'sblue']
+    ]
+
+# Colors of kikagaku letters
+kikagaku_colors = dict \
+    ( r = 'sred',    p = 'spink',   v = 'sviolet'
+    , g = 'sgrey',   o = 'sorange', y = 'syellow'
+    , l = 'slgreen', d = 'sdgreen', b = 'sblue'
+    )
+
+def letter_colors (kikagaku):
+    """ Map kikagaku letters to color names. Letters from the color
+        table are mapped to their color, other letters get one of the
+        remaining colors.
+        >>> sorted (letter_colors ([list ('rrrxxxyyy')] * 9).items ())
+        [('r', 'sred'), ('x', 'sviolet'), ('y', 'syellow')]
+    """
+    kik_color = {}
+    letters   = []
+    for row in kikagaku:
+        for c in row:
+            if c not in letters:
+                letters.append (c)
+    for c in letters:
+        if c in kikagaku_colors:
+            kik_color [c] = kikagaku_colors [c]
+    used = set (kik_color.values ())
+    free = sorted (c for c in kikagaku_colors.values () if c not in used)
+    for c in letters:
+        if c not in kik_color:
+            kik_color [c] = free.pop ()
+    return kik_color
+# end def letter_colors
+
+def tile_colors (diagonal, colorconstrained, kikagaku):
+    """ Background color name of each tile, 9 rows of 9 colors
+        >>> tile_colors (True, True, None) [1][:4]
+        ['sgrey', 'yellow', 'syellow', 'sgrey']
+    """
+    if kikagaku:
+        kik_color = letter_colors (kikagaku)
+        return [[kik_color [c] for c in row] for row in kikagaku]
+    result = []
+    for r in range (9):
+        row = []
+        for c in range (9):
+            color = 'white'
+            if colorconstrained:
+                color = quadrant_colors [r % 3][c % 3]
+            if diagonal and (r == c or r == 8 - c):
+                color = 'yellow'
+            row.append (color)
+        result.append (row)
+    return result
+# end def tile_colors
+
+def layout (puzzle):
+    """ Hashable key for the variant and layout of puzzle """
+    kikagaku = None
+    if puzzle.kikagaku:
+        kikagaku = tuple (''.join (row) for row in puzzle.kikagaku)
+    return (bool (puzzle.diagonal), bool (puzzle.colorconstrained), kikagaku)
+# end def layout
+
+class Renderer:
+    """ Base class of all renderers.
+        Derived classes define the string used for each digit (index 0
+        is the empty tile) and compile, which returns a %-template with
+        81 placeholders for the digits of a puzzle of the given layout.
+        The default is the plain text layout. Templates are cached per
+        renderer instance.
+    """
+    digits   = '0123456789'
+    # Several puzzles can be written to one file
+    multiple = True
+
+    def __init__ (self):
+        self.templates = {}
+    # end def __init__
+
+    def compile (self, diagonal, colorconstrained, kikagaku):
+        """ Nine lines of digits followed by an empty line """
+        return ('%s' * 9 + '\n') * 9 + '\n'
+    # end def compile
+
+    def template (self, puzzle):
+        key = layout (puzzle)
+        try:
+            return self.templates [key]
+        except KeyError:
+            pass
+        t = self.templates [key] = self.compile (*key)
+        return t
+    # end def template
+
+    def puzzle (self, puzzle):
+        """ Render a single puzzle """
+        d = self.digits
+        return self.template (puzzle) % tuple \
+            (d [v] for row in puzzle.puzzle for v in row)
+    # end def puzzle
+
+    def entry (self, puzzle):
+        """ A puzzle as an entry of a batch, default is the puzzle """
+        return self.puzzle (puzzle)
+    # end def entry
+
+    def header (self, **kw):
+        return ''
+    # end def header
+
+    def footer (self, **kw):
+        return ''
+    # end def footer
+
+    def render (self, puzzles, file = None, chunk = 1000, **kw):
+        """ Render puzzles (any iterable) to file. At most chunk
+            puzzles are buffered, each chunk is written with a single
+            call. Keyword arguments are passed to header and footer.
+        """
+        if file is None:
+            file = sys.stdout
+        buf = [self.header (**kw)]
+        for p in puzzles:
+            buf.append (self.entry (p))
+            if len (buf) >= chunk:
+                file.write (''.join (buf))
+                buf = []
+        buf.append (self.footer (**kw))
+        file.write (''.join (buf))
+    # end def render
+
+# end class Renderer
+
+class Text_Renderer (Renderer):
+    """ The puzzle as 9 lines of digits followed by an empty line
+        >>> from sudokumaker.sudoku import Puzzle
+        >>> text.puzzle (Puzzle.from_bytes (bytes (range (9)) * 9)) [:20]
+        '012345678\\n012345678\\n'
+    """
+
+# end class Text_Renderer
+
+class Tex_Renderer (Renderer):
+    """ The puzzle as a LaTeX tabular, the width of a tile is the TeX
+        length w which must be set by the document.
+        >>> from sudokumaker.sudoku import Puzzle
+        >>> p = Puzzle.from_bytes (bytes (range (9)) * 9, diagonal = True)
+        >>> tex.puzzle (p).split ('\\n') [5].split ('&') [0]
+        '\\\\colorbox{yellow}{\\\\hbox to\\\\w{\\\\hfil\\\\strut \\\\hfil}}'
+        >>> len (tex.templates)
+        1
+    """
+    digits = ('',) + tuple ('123456789')
+
+    def compile (self, diagonal, colorconstrained, kikagaku):
+        colors = tile_colors (diagonal, colorconstrained, kikagaku)
+        s = [tex_table_head.replace ('%', '%%')]
+        for r in range (9):
+            s.append ("\\hline\n")
+            if r % 3 == 0 and r and not kikagaku:
+                s.append ("\\hline\n")
+            cells = (tex_cell % (colors [r][c], '%s') for c in range (9))
+            s.append ('&'.join (cells))
+            s.append (" \\\\\n")
+        s.append ("\\hline\n\\end{tabular}\n")
+        return ''.join (s)
+    # end def compile
+
+    def preamble (self, colored):
+        """ Document class, packages and color definitions """
+        if colored:
+            return tex_preamble + tex_color_defs
+        return tex_preamble
+    # end def preamble
+
+    def header \
+        (self, date = None, title = '', author = None, colored = True):
+        """ Preamble and title, the color definitions are only needed
+            if one of the puzzles is colored.
+        """
+        if not author:
+            author = 'Sudoku-Maker by Ralf Schlatterbeck'
+        if not date:
+            date = time.strftime ('%Y-%m-%d')
+        return self.preamble (colored) + tex_title % (date, author, title)
+    # end def header
+
+    def footer (self, **kw):
+        return "\\end{document}\n"
+    # end def footer
+
+    def entry (self, puzzle):
+        """ One puzzle per page """
+        return \
+            ( "\\Huge\n\\begin{center}\n\\setlength{\\w}{3ex}\n"
+            + self.puzzle (puzzle)
+            + "\\end{center}\n\\clearpage\n"
+            )
+    # end def entry
+
+# end class Tex_Renderer
+
+class Svg_Renderer (Renderer):
+    """ The puzzle as a standalone SVG image with the same colors as
+        the TeX output. Thick lines separate the regions of the
+        puzzle, i.e., the 3x3 quadrants or the kikagaku colors.
+        >>> from sudokumaker.sudoku import Puzzle
+        >>> p = Puzzle.from_bytes (bytes (range (9)) * 9, diagonal = True)
+        >>> s = svg.puzzle (p)
+        >>> s.count ('<rect'), s.count ('fill="#FFFF00"')
+        (82, 17)
+        >>> s [s.index ('<text') : s.index ('</text>') + 7]
+        '<text x="22" y="22"></text>'
+    """
+    multiple = False
+    size     = 40
+    margin   = 2
+    digits   = ('',) + tuple ('123456789')
+
+    def compile (self, diagonal, colorconstrained, kikagaku):
+        colors = tile_colors (diagonal, colorconstrained, kikagaku)
+        if kikagaku:
+            region = kikagaku
+        else:
+            region = [[(r // 3, c // 3) for c in range (9)] for r in range (9)]
+        sz = self.size
+        m  = self.margin
+        w  = 9 * sz + 2 * m
+        s  = \
+            [ '<svg xmlns="http://www.w3.org/2000/svg"'
+              ' width="%d" height="%d" viewBox="0 0 %d %d">\n' % (w, w, w, w)
+            ]
+        for r in range (9):
+            for c in range (9):
+                s.append \
+                    ( '<rect x="%d" y="%d" width="%d" height="%d"'
+                      ' fill="#%s"/>\n'
+                    % (m + c * sz, m + r * sz, sz, sz
+                      , svg_colors [colors [r][c]]
+                      )
+                    )
+        line = '<line x1="%d" y1="%d" x2="%d" y2="%d"/>\n'
+        s.append ('<g stroke="black" stroke-width="1">\n')
+        for n in range (1, 9):
+            p = m + n * sz
+            s.append (line % (m, p, w - m, p))
+            s.append (line % (p, m, p, w - m))
+        s.append ('</g>\n<g stroke="black" stroke-width="3">\n')
+        for r in range (9):
+            for c in range (9):
+                x = m + c * sz
+                y = m + r * sz
+                if c < 8 and region [r][c] != region [r][c + 1]:
+                    s.append (line % (x + sz, y, x + sz, y + sz))
+                if r < 8 and region [r][c] != region [r + 1][c]:
+                    s.append (line % (x, y + sz, x + sz, y + sz))
+        s.append \
+            ( '<rect x="%d" y="%d" width="%d" height="%d" fill="none"/>\n'
+            % (m, m, 9 * sz, 9 * sz)
+            )
+        s.append \
+            ( '</g>\n<g font-family="serif" font-size="%d"'
+              ' text-anchor="middle" dominant-baseline="central">\n'
+            % (sz * 7 // 10)
+            )
+        for r in range (9):
+            for c in range (9):
+                s.append \
+                    ( '<text x="%d" y="%d">%%s</text>\n'
+                    % (m + c * sz + sz // 2, m + r * sz + sz // 2)
+                    )
+        s.append ('</g>\n</svg>\n')
+        return ''.join (s)
+    # end def compile
+
+# end class Svg_Renderer
+
+class Json_Renderer (Renderer):
+    """ The puzzle as one line of JSON in the request format of the
+        solve service: the 81 tiles as digits (0 is an empty tile) and
+        the variant flags if set.
+        >>> from sudokumaker.sudoku import Puzzle
+        >>> import json
+        >>> p = Puzzle.from_bytes (bytes (range (9)) * 9, diagonal = True)
+        >>> d = json.loads (json_lines.puzzle (p))
+        >>> d ['puzzle'] [:10], d ['diagonal'], 'kikagaku' in d
+        ('0123456780', True, False)
+    """
+
+    def compile (self, diagonal, colorconstrained, kikagaku):
+        # Only needed for kikagaku, not imported with the module
+        import json
+        s = ['{"puzzle":"', '%s' * 81, '"']
+        if diagonal:
+            s.append (',"diagonal":true')
+        if colorconstrained:
+            s.append (',"colorconstrained":true')
+        if kikagaku:
+            kik = json.dumps (''.join (kikagaku))
+            s.append (',"kikagaku":%s' % kik.replace ('%', '%%'))
+        s.append ('}\n')
+        return ''.join (s)
+    # end def compile
+
+# end class Json_Renderer
+
+text       = Text_Renderer ()
+tex        = Tex_Renderer ()
+svg        = Svg_Renderer ()
+json_lines = Json_Renderer ()
+
+renderers  = {}
+
+def register (name, renderer):
+    """ Register a renderer instance under name, this makes it
+        available to the sudoku_render command.
+    """
+    renderers [name] = renderer
+# end def register
+
+register ('text', text)
+register ('tex',  tex)
+register ('svg',  svg)
+register ('json', json_lines)
+
+def main (argv = None):
+    # Imported here to keep the module cheap to import as a library
+    from argparse                  import ArgumentParser
+    from sudokumaker.Version       import VERSION
+    # Puzzle reading is shared with the TeX booklet
+    from sudokumaker.sudoku_as_tex import read_puzzles
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( "file"
+        , help    = "File name(s) of sudoku files with one or more puzzles"
+                    " separated by blank lines, default stdin"
+        , nargs   = '*'
+        )
+    cmd.add_argument \
+        ( "-c", "--colorconstrained"
+        , help    = "Add constraint that same colors must be different"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-d", "--diagonal"
+        , help    = "Add constraint that diagonals must be unique"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-f", "--format"
+        , dest    = "format"
+        , help    = "Output format, one of %s, default=%%(default)s"
+                  % ', '.join (sorted (renderers))
+        , choices = sorted (renderers)
+        , default = 'svg'
+        )
+    cmd.add_argument \
+        ( "-k", "--kikagaku"
+        , help    = "Kikagaku sudoku: Different colors must be unique"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-o", "--output"
+        , dest    = "output"
+        , help    = "Output file, default stdout. If the name contains"
+                    " %%d, each puzzle is written to its own file"
+                    " numbered from 1"
+        )
+    cmd.add_argument \
+        ( "-v", "--version"
+        , help    = "Display version"
+        , action  = "version"
+        , version = "%%(prog)s %s" % VERSION
+        )
+    args = cmd.parse_args (argv)
+    renderer = renderers [args.format]
+    kw = dict \
+        ( diagonal         = args.diagonal
+        , colorconstrained = args.colorconstrained
+        , kikagaku         = args.kikagaku
+        )
+    def puzzles ():
+        for fn in args.file or [None]:
+            with (open (fn) if fn else sys.stdin) as f:
+                for p in read_puzzles (f, **kw):
+                    yield p
+    if args.output and '%' in args.output:
+        for n, p in enumerate (puzzles ()):
+            with open (args.output % (n + 1), 'w') as f:
+                renderer.render ((p,), f)
+        return
+    p = puzzles ()
+    if not renderer.multiple:
+        p = list (p)
+        if len (p) > 1:
+            cmd.error ("Need %d in output name for several puzzles")
+    if args.output:
+        with open (args.output, 'w') as f:
+            renderer.render (p, f)
+    else:
+        renderer.render (p)
+# end def main
+
+if __name__ == '__main__':
+    main (sys.argv [1:])
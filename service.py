@@ -0,0 +1,397 @@
+#!/usr/bin/python3
+# Copyright (C) 2005-2022 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+# ****************************************************************************
+
+""" Asyncio line protocol front end for the solver.
+    Each request is one line, either a puzzle of 81 characters (digits,
+    '0' or '.' for an empty tile) or a JSON object with the puzzle in
+    the key 'puzzle' and optional keys 'id', 'diagonal',
+    'colorconstrained' and 'solvemax'. Each reply is one line of JSON
+    with the id of the request (defaults to the line number on this
+    connection), a status ('ok', 'timeout', 'exceeded' or 'error'), the
+    solvecount and the solutions found. Replies are sent in order of
+    completion. The solver in the worker gets 80% of the request
+    timeout as its time budget, so a hard puzzle does not block a
+    worker (status 'exceeded' with the partial result).
+    The line 'stats' returns the service metrics.
+"""
+
+import sys
+import json
+import time
+import asyncio
+import multiprocessing
+from   collections         import deque
+from   concurrent.futures  import ProcessPoolExecutor
+from   argparse            import ArgumentParser
+from   sudokumaker.sudoku  import Puzzle
+from   sudokumaker.Version import VERSION
+
+def parse_puzzle (text):
+    """ Convert puzzle text to 81 bytes
+        >>> parse_puzzle ('1.3' + '0' * 78) [:4]
+        b'\\x01\\x00\\x03\\x00'
+        >>> parse_puzzle ('123')
+        Traceback (most recent call last):
+        ...
+        ValueError: Puzzle must have 81 tiles
+    """
+    text = ''.join (text.split ()).replace ('.', '0')
+    if len (text) != 81:
+        raise ValueError ("Puzzle must have 81 tiles")
+    if not text.isdigit ():
+        raise ValueError ("Puzzle must contain only digits or '.'")
+    return bytes (ord (c) - ord ('0') for c in text)
+# end def parse_puzzle
+
+def solve_batch (batch):
+    """ Solve a batch of puzzles in a worker process.
+        Each item is the puzzle as bytes and the keyword arguments
+        for Puzzle, the result is a list of (exceeded, solvecount,
+        solutions), exceeded is the name of an exceeded budget or None.
+        A request that fails gets a ValueError with the message instead,
+        the other requests of the batch are not affected.
+        >>> r = solve_batch \\
+        ...     ( [ (bytes (81), dict (solvemax = 'x'))
+        ...       , (bytes (81), dict (solvemax = 1))
+        ...       ]
+        ...     )
+        >>> isinstance (r [0], ValueError), r [1][:2]
+        (True, (None, 1))
+    """
+    result = []
+    for vals, kw in batch:
+        try:
+            puzzle = Puzzle.from_bytes (vals, verbose = False, **kw)
+            puzzle.solve ()
+        except Exception as err:
+            result.append (ValueError ("%s: %s" % (type (err).__name__, err)))
+            continue
+        solutions = [''.join (str (n) for n in s) for s in puzzle.solutions]
+        result.append ((puzzle.exceeded, puzzle.solvecount, solutions))
+    return result
+# end def solve_batch
+
+class Request:
+    """ A single solve request waiting for its result """
+
+    def __init__ (self, id, vals, kw):
+        self.id      = id
+        self.vals    = vals
+        self.kw      = kw
+        self.start   = time.time ()
+        self.future  = asyncio.get_running_loop ().create_future ()
+    # end def __init__
+
+# end class Request
+
+class Solve_Service:
+    """ Dispatch solve requests to a process pool.
+        Requests are put into a bounded queue, a full queue stops
+        reading from the client connection (backpressure). Requests
+        arriving within batch_delay seconds are combined into one pool
+        task of at most batch_size puzzles. At most two batches per
+        worker are in flight. Requests not answered within timeout
+        seconds get a 'timeout' reply, their result is discarded.
+    """
+
+    def __init__ \
+        ( self
+        , jobs        = None
+        , batch_size  = 32
+        , batch_delay = 0.002
+        , queue_size  = 1024
+        , timeout     = 10.0
+        , solvemax    = 2
+        ):
+        self.jobs        = jobs or multiprocessing.cpu_count ()
+        self.batch_size  = batch_size
+        self.batch_delay = batch_delay
+        self.queue_size  = queue_size
+        self.timeout     = timeout
+        self.solvemax    = solvemax
+        self.latency     = deque (maxlen = 10000)
+        self.in_flight   = 0
+        self.counters    = dict \
+            ( requests  = 0
+            , completed = 0
+            , timeouts  = 0
+            , errors    = 0
+            , batches   = 0
+            )
+    # end def __init__
+
+    def metrics (self):
+        """ Queue depth, counters and latency (ms) of recent requests """
+        m = dict (self.counters)
+        m ['queue_depth'] = self.queue.qsize ()
+        m ['in_flight']   = self.in_flight
+        lat = sorted (self.latency)
+        if lat:
+            m ['latency_mean'] = 1000 * sum (lat) / len (lat)
+            m ['latency_p50']  = 1000 * lat [len (lat) // 2]
+            m ['latency_p99']  = 1000 * lat [int (len (lat) * 0.99)]
+        return m
+    # end def metrics
+
+    def request (self, id, line):
+        """ Parse a request line, either a bare puzzle or JSON.
+            The types of the JSON fields are checked here, so a bad
+            request gets its own error reply.
+            >>> s = Solve_Service ()
+            >>> s.request (1, '{"puzzle": 5}')
+            Traceback (most recent call last):
+            ...
+            TypeError: puzzle must be a string
+            >>> s.request (1, '{"puzzle": "", "solvemax": "2"}')
+            Traceback (most recent call last):
+            ...
+            TypeError: solvemax must be a positive integer
+            >>> s.request (1, '{"puzzle": "", "diagonal": 1}')
+            Traceback (most recent call last):
+            ...
+            TypeError: diagonal must be true or false
+        """
+        kw = dict (solvemax = self.solvemax)
+        if line.startswith ('{'):
+            d  = json.loads (line)
+            id = d.get ('id', id)
+            for k in 'diagonal', 'colorconstrained':
+                if k in d:
+                    if not isinstance (d [k], bool):
+                        raise TypeError ("%s must be true or false" % k)
+                    kw [k] = d [k]
+            if 'solvemax' in d:
+                v = d ['solvemax']
+                if isinstance (v, bool) or not isinstance (v, int) or v < 1:
+                    raise TypeError ("solvemax must be a positive integer")
+                kw ['solvemax'] = v
+            line = d ['puzzle']
+            if not isinstance (line, str):
+                raise TypeError ("puzzle must be a string")
+        kw ['keepmax'] = kw ['solvemax']
+        kw ['maxtime'] = 0.8 * self.timeout
+        return Request (id, parse_puzzle (line), kw)
+    # end def request
+
+    async def answer (self, req):
+        """ Wait for the result of req and build the reply """
+        try:
+            exceeded, solvecount, solutions = await asyncio.wait_for \
+                (asyncio.shield (req.future), self.timeout)
+        except asyncio.TimeoutError:
+            self.counters ['timeouts'] += 1
+            req.future.cancel ()
+            return dict (id = req.id, status = 'timeout')
+        except Exception as err:
+            self.counters ['errors'] += 1
+            return dict (id = req.id, status = 'error', error = str (err))
+        self.counters ['completed'] += 1
+        self.latency.append (time.time () - req.start)
+        return dict \
+            ( id         = req.id
+            , status     = 'exceeded' if exceeded else 'ok'
+            , solvecount = solvecount
+            , solutions  = solutions
+            )
+    # end def answer
+
+    async def reply (self, writer, req):
+        result = await self.answer (req)
+        writer.write (json.dumps (result).encode ('utf-8') + b'\n')
+        await writer.drain ()
+    # end def reply
+
+    async def handle_client (self, reader, writer):
+        tasks  = set ()
+        lineno = 0
+        while True:
+            line = await reader.readline ()
+            if not line:
+                break
+            line = line.decode ('utf-8').strip ()
+            if not line:
+                continue
+            lineno += 1
+            if line == 'stats':
+                m = json.dumps (self.metrics ())
+                writer.write (m.encode ('utf-8') + b'\n')
+                await writer.drain ()
+                continue
+            self.counters ['requests'] += 1
+            try:
+                req = self.request (lineno, line)
+            except (ValueError, KeyError, TypeError) as err:
+                self.counters ['errors'] += 1
+                r = dict (id = lineno, status = 'error', error = str (err))
+                writer.write (json.dumps (r).encode ('utf-8') + b'\n')
+                continue
+            await self.queue.put (req)
+            task = asyncio.ensure_future (self.reply (writer, req))
+            tasks.add (task)
+            task.add_done_callback (tasks.discard)
+        if tasks:
+            await asyncio.wait (tasks)
+        writer.close ()
+    # end def handle_client
+
+    async def batcher (self):
+        """ Collect requests into batches and dispatch them """
+        loop = asyncio.get_running_loop ()
+        while True:
+            batch    = [await self.queue.get ()]
+            deadline = loop.time () + self.batch_delay
+            while len (batch) < self.batch_size:
+                remaining = deadline - loop.time ()
+                if remaining <= 0:
+                    break
+                try:
+                    req = await asyncio.wait_for (self.queue.get (), remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append (req)
+            # Don't bother solving requests that already timed out
+            batch = [r for r in batch if not r.future.done ()]
+            if not batch:
+                continue
+            await self.slots.acquire ()
+            self.counters ['batches'] += 1
+            self.in_flight += 1
+            asyncio.ensure_future (self.run_batch (batch))
+    # end def batcher
+
+    async def run_batch (self, batch):
+        loop = asyncio.get_running_loop ()
+        try:
+            result = await loop.run_in_executor \
+                (self.pool, solve_batch, [(r.vals, r.kw) for r in batch])
+        except Exception as err:
+            for r in batch:
+                if not r.future.done ():
+                    r.future.set_exception (err)
+        else:
+            for r, res in zip (batch, result):
+                if r.future.done ():
+                    continue
+                if isinstance (res, Exception):
+                    r.future.set_exception (res)
+                else:
+                    r.future.set_result (res)
+        finally:
+            self.in_flight -= 1
+            self.slots.release ()
+    # end def run_batch
+
+    async def serve (self, host = 'localhost', port = 8081, path = None):
+        self.queue = asyncio.Queue (self.queue_size)
+        self.slots = asyncio.Semaphore (2 * self.jobs)
+        with ProcessPoolExecutor (max_workers = self.jobs) as self.pool:
+            batcher = asyncio.ensure_future (self.batcher ())
+            if path:
+                server = await asyncio.start_unix_server \
+                    (self.handle_client, path = path)
+            else:
+                server = await asyncio.start_server \
+                    (self.handle_client, host, port)
+            try:
+                async with server:
+                    await server.serve_forever ()
+            finally:
+                batcher.cancel ()
+    # end def serve
+
+# end class Solve_Service
+
+def main (argv = None):
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( "-b", "--batch-size"
+        , dest    = "batch_size"
+        , help    = "Maximum number of puzzles per batch, default=%(default)s"
+        , type    = int
+        , default = 32
+        )
+    cmd.add_argument \
+        ( "-H", "--host"
+        , dest    = "host"
+        , help    = "Host address to listen on, default=%(default)s"
+        , default = 'localhost'
+        )
+    cmd.add_argument \
+        ( "-j", "--jobs"
+        , dest    = "jobs"
+        , help    = "Number of worker processes, default: number of CPUs"
+        , type    = int
+        )
+    cmd.add_argument \
+        ( "-m", "--solvemax"
+        , dest    = "solvemax"
+        , help    = "Default maximum number of solutions, default=%(default)s"
+        , type    = int
+        , default = 2
+        )
+    cmd.add_argument \
+        ( "-p", "--port"
+        , dest    = "port"
+        , help    = "TCP port to listen on, default=%(default)s"
+        , type    = int
+        , default = 8081
+        )
+    cmd.add_argument \
+        ( "-q", "--queue-size"
+        , dest    = "queue_size"
+        , help    = "Maximum number of queued requests, default=%(default)s"
+        , type    = int
+        , default = 1024
+        )
+    cmd.add_argument \
+        ( "-T", "--timeout"
+        , dest    = "timeout"
+        , help    = "Timeout per request in seconds, default=%(default)s"
+        , type    = float
+        , default = 10.0
+        )
+    cmd.add_argument \
+        ( "-u", "--unix-socket"
+        , dest    = "path"
+        , help    = "Listen on this unix socket instead of TCP"
+        )
+    cmd.add_argument \
+        ( "-v", "--version"
+        , help    = "Display version"
+        , action  = "version"
+        , version = "%%(prog)s %s" % VERSION
+        )
+    args = cmd.parse_args (argv)
+    service = Solve_Service \
+        ( jobs       = args.jobs
+        , batch_size = args.batch_size
+        , queue_size = args.queue_size
+        , timeout    = args.timeout
+        , solvemax   = args.solvemax
+        )
+    try:
+        asyncio.run (service.serve (args.host, args.port, args.path))
+    except KeyboardInterrupt:
+        pass
+# end def main
+
+if __name__ == '__main__':
+    main (sys.argv [1:])
@@ -49,6 +49,11 @@ setup \
             , 'sudoku=sudokumaker.sudoku:main'
             , 'sudoku_as_tex=sudokumaker.sudoku_as_tex:main'
             , 'sumsudoku=sudokumaker.sumsudoku:main'
+            , 'sudoku_service=sudokumaker.service:main'
+            , 'sudoku_render=sudokumaker.render:main'
+            , 'sudoku_grade=sudokumaker.grade:main'
+            , 'sudoku_index=sudokumaker.index:main'
+            , 'sudoku_layout=sudokumaker.layout:main'
             ]
         )
     , install_requires = ['pgapy', 'rsclib']
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+# Copyright (C) 2005-2022 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+# ****************************************************************************
+
+""" Startup benchmark: Import cost of the command-line entry points
+    measured with python -X importtime. For each entry point we run
+    the import several times in a fresh interpreter and report the
+    minimum cumulative import time of the entry module and the
+    modules with the highest own import time.
+"""
+
+import sys
+import json
+import subprocess
+from   argparse import ArgumentParser
+
+entry_points = \
+    ( ('sudoku',         'sudokumaker.sudoku')
+    , ('sudoku_as_tex',  'sudokumaker.sudoku_as_tex')
+    , ('sumsudoku',      'sudokumaker.sumsudoku')
+    , ('sudokumaker',    'sudokumaker.maker')
+    , ('sudoku_service', 'sudokumaker.service')
+    , ('sudoku_render',  'sudokumaker.render')
+    , ('sudoku_grade',   'sudokumaker.grade')
+    , ('sudoku_index',   'sudokumaker.index')
+    , ('sudoku_layout',  'sudokumaker.layout')
+    )
+
+def parse_importtime (text):
+    """ Parse output of -X importtime into a list of
+        (module, self, cumulative), times in microseconds.
+        >>> t = 'import time: self [us] | cumulative | imported package\\n'
+        >>> t += 'import time:       145 |        486 |   rsclib.autosuper\\n'
+        >>> parse_importtime (t)
+        [('rsclib.autosuper', 145, 486)]
+    """
+    result = []
+    for line in text.splitlines ():
+        if not line.startswith ('import time:'):
+            continue
+        own, cumulative, name = line [len ('import time:'):].split ('|')
+        try:
+            result.append ((name.strip (), int (own), int (cumulative)))
+        except ValueError:
+            pass # header line
+    return result
+# end def parse_importtime
+
+def measure (module, repeat = 5, top = 5):
+    """ Minimum cumulative import time of module and the top modules
+        by their own import time (from the fastest run).
+    """
+    best = None
+    for r in range (repeat):
+        p = subprocess.run \
+            ( [sys.executable, '-X', 'importtime', '-c', 'import ' + module]
+            , stdout = subprocess.PIPE
+            , stderr = subprocess.PIPE
+            , universal_newlines = True
+            )
+        if p.returncode:
+            raise RuntimeError \
+                ("Import of %s failed:\n%s" % (module, p.stderr))
+        times = parse_importtime (p.stderr)
+        cum   = [c for name, s, c in times if name == module] [0]
+        if best is None or cum < best [0]:
+            best = (cum, times)
+    cum, times = best
+    heavy = sorted (times, key = lambda x: -x [1]) [:top]
+    return dict \
+        ( module     = module
+        , cumulative = cum
+        , heaviest   = [dict (module = n, self = s) for n, s, c in heavy]
+        )
+# end def measure
+
+def main (argv = None):
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( "-j", "--json"
+        , dest    = "json"
+        , help    = "Write results as JSON to this file"
+        )
+    cmd.add_argument \
+        ( "-r", "--repeat"
+        , dest    = "repeat"
+        , help    = "Number of runs per entry point, default=%(default)s"
+        , type    = int
+        , default = 5
+        )
+    args = cmd.parse_args (argv)
+    result = {}
+    for name, module in entry_points:
+        m = result [name] = measure (module, args.repeat)
+        print ("%-15s %8.1f ms" % (name, m ['cumulative'] / 1000.0))
+        for h in m ['heaviest']:
+            print ("    %-30s %8.1f ms" % (h ['module'], h ['self'] / 1000.0))
+    if args.json:
+        with open (args.json, 'w') as f:
+            json.dump (result, f, indent = 2)
+# end def main
+
+if __name__ == '__main__':
+    main (sys.argv [1:])
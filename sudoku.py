@@ -22,13 +22,11 @@
 from   __future__ import print_function
 import sys
 import time
+import random
 from   copy                import copy
-from   rsclib.autosuper    import autosuper
-from   rsclib.iter_recipes import combinations
-from   textwrap            import dedent
-from   operator            import and_
-from   functools           import reduce
-from   argparse            import ArgumentParser
+from   collections         import deque
+from   itertools           import combinations
+from   sudokumaker.sumsudoku import sum_masks
 from   sudokumaker.Version import VERSION
 
 
@@ -86,15 +84,47 @@ class Statistics (dict):
 
 Statistics.cumulated = Statistics (-1)
 
-class Tile (set, autosuper):
+class Budget_Exceeded (Exception):
+    """ Raised when a solver budget is exhausted, the argument is the
+        name of the budget: 'nodes', 'steps' or 'time'.
+    """
+# end class Budget_Exceeded
+
+class Restart (Exception):
+    """ Raised when a search run with restarts uses up its node budget """
+# end class Restart
+
+def luby (i):
+    """ The i-th element (starting with 1) of the Luby sequence
+        >>> [luby (i) for i in range (1, 16)]
+        [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8]
+    """
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while i != (1 << k) - 1:
+        i -= (1 << (k - 1)) - 1
+        k  = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
+# end def luby
+
+class Tile (set):
     """ Class representing alternatives at a single tile position in a puzzle.
         This is basically a set with some additional methods and
         variables to remember the position in the puzzle.
+        Tile is not derived from autosuper: It has no __slots__, so
+        every Tile would get a __dict__.
+        >>> hasattr (Tile (None, 0, 0), '__dict__')
+        False
     """
+    __slots__ = ('parent', 'row', 'col')
+
     def __init__ (self, parent, row, col, iterable = None):
         if iterable is None:
             iterable = range (1, 10)
-        self.__super.__init__ (iterable)
+        set.__init__ (self, iterable)
         self.parent = parent
         self.row    = row
         self.col    = col
@@ -115,7 +145,7 @@ class Tile (set, autosuper):
     def discard (self, val):
         """ Discard val from possibilities """
         l = len (self)
-        self.__super.discard (val)
+        set.discard (self, val)
         if not len (self):
             self.parent.mark_unsolvable ()
         elif len (self) != l:
@@ -166,7 +196,27 @@ class Alternatives:
         We store the set of possibilities for each tile position.
         The inverse structure solved_by_n stores for each number the set
         of positions where this number is the only possibility.
+        Optional killer cages are a list of (sum, positions), the
+        numbers in a cage must not repeat and must add up to the sum.
+        The level limits the propagation rules used, in ascending
+        strength: 1 only removes solved numbers from the other tiles of
+        a row, column etc. (and checks cages), 2 adds numbers that are
+        possible in only one tile of a row, column etc. (see invert),
+        3 (the default) adds sets of numbers confined to as many tiles.
+        Units (row, column, etc.) with changed tiles are scheduled in
+        a worklist, see invert. The class-wide dicts scans and hits
+        count for each rule how often it was applied and how often
+        this changed a tile.
     """
+    __slots__ = \
+        ( 'cage_idx', 'cages', 'changes', 'colorconstrained', 'depth'
+        , 'diagonal', 'dirty', 'kikagaku', 'kikagaku_color', 'kikagaku_idx'
+        , 'level', 'pending', 'queue', 'sets_dirty', 'sets_queue'
+        , 'solvable', 'solved_by_n', 'steps', 'tile', 'units'
+        )
+    rules = ('eliminate', 'cage', 'hidden', 'sets')
+    scans = dict.fromkeys (rules, 0)
+    hits  = dict.fromkeys (rules, 0)
 
     def __init__ \
         ( self
@@ -176,18 +226,32 @@ class Alternatives:
         , colorconstrained = False
         , kikagaku         = None
         , depth            = 0
+        , cages            = None
+        , level            = 3
+        , units            = None
         ):
         self.solvable         = True
         self.diagonal         = diagonal
         self.colorconstrained = colorconstrained
         self.depth            = depth
+        self.level            = level
+        self.steps            = 0
+        self.changes          = 0
         self.kikagaku_idx     = None
         self.pending          = set ()
         self.dirty            = set ()
+        self.queue            = deque ()
+        self.sets_dirty       = set ()
+        self.sets_queue       = deque ()
         self.tile             = tile or {}
         self.kikagaku         = None
+        self.cages            = None
+        self.cage_idx         = None
         if kikagaku:
             self.init_kikagaku (kikagaku)
+        if cages:
+            self.init_cages (cages)
+        self.units = units or self.unit_index ()
         if tile:
             self.solved_by_n = dict ((n, set ()) for n in range (1, 10))
             for t in self.tiles ():
@@ -199,11 +263,15 @@ class Alternatives:
             for c in range (9):
                 self.tile [(r, c)] = Tile (self, r, c)
         self.solved_by_n = dict ((n, set ()) for n in range (1, 10))
-        if puzzle:
-            for r in range (9):
-                for c in range (9):
-                    if puzzle [r][c]:
-                        self.tile [(r, c)].set (puzzle [r][c])
+        if self.cages:
+            for idx in range (len (self.cages)):
+                self.schedule (('cage_iter', idx))
+        if puzzle or self.cages:
+            if puzzle:
+                for r in range (9):
+                    for c in range (9):
+                        if puzzle [r][c]:
+                            self.tile [(r, c)].set (puzzle [r][c])
             self.update ()
             self.invert ()
         #print (self)
@@ -217,14 +285,77 @@ class Alternatives:
         for k, v in self.tile.items ():
             tile [k] = v.copy ()
         assert (self.solvable)
-        return self.__class__ \
+        alt = self.__class__ \
             ( tile = tile
             , diagonal         = self.diagonal
             , colorconstrained = self.colorconstrained
             , depth            = self.depth + 1
+            , level            = self.level
+            , units            = self.units
             )
+        # Share the (immutable) kikagaku and cage structures
+        alt.kikagaku       = self.kikagaku
+        alt.kikagaku_idx   = self.kikagaku_idx
+        alt.cages          = self.cages
+        alt.cage_idx       = self.cage_idx
+        if self.kikagaku:
+            alt.kikagaku_color = self.kikagaku_color
+        return alt
     # end def copy
 
+    def copy_into (self, alt):
+        """ Reset alt in place to a copy of self: Contents of tiles
+            and sets are copied, no new objects are created. alt must
+            have been created for the same puzzle layout.
+            >>> a = Alternatives ()
+            >>> b = a.copy ()
+            >>> a.set (0, 0, 1)
+            >>> a.copy_into (b)
+            >>> b.state () == a.state (), b.tile [(0, 0)].parent is b
+            (True, True)
+        """
+        assert (self.solvable)
+        tile = alt.tile
+        for k, v in self.tile.items ():
+            t = tile [k]
+            t.clear  ()
+            t.update (v)
+        for n, s in self.solved_by_n.items ():
+            t = alt.solved_by_n [n]
+            t.clear  ()
+            t.update (s)
+        alt.pending.clear ()
+        alt.dirty.clear ()
+        alt.queue.clear ()
+        alt.sets_dirty.clear ()
+        alt.sets_queue.clear ()
+        alt.solvable = True
+        alt.steps    = 0
+        alt.depth    = self.depth + 1
+        alt.level    = self.level
+    # end def copy_into
+
+    @classmethod
+    def from_state (cls, state, **kw):
+        """ Inverse of state: Build Alternatives from 81 bitmasks.
+            The state is assumed to be propagated already.
+            Keyword args are passed to __init__.
+            >>> a = Alternatives ()
+            >>> a.set (4, 4, 5)
+            >>> b = Alternatives.from_state (a.state ())
+            >>> b.state () == a.state ()
+            True
+            >>> b.tile [(4, 4)]
+            Tile (row = 4, col = 4, 5)
+        """
+        tile = {}
+        for k, mask in enumerate (state):
+            r, c = divmod (k, 9)
+            tile [(r, c)] = Tile \
+                (None, r, c, (n for n in range (1, 10) if mask & (1 << n)))
+        return cls (tile = tile, **kw)
+    # end def from_state
+
     def init_kikagaku (self, kikagaku):
         self.kikagaku_color = {}
         self.kikagaku = []
@@ -254,11 +385,85 @@ class Alternatives:
                     ("Invalid number of tiles in kikagaku color %s" % color)
     # end def init_kikagaku
 
+    def init_cages (self, cages):
+        """ Killer cages: list of (sum, positions)
+            >>> a = Alternatives (cages = [(3, [(0, 0), (0, 1)])])
+            >>> a.tile [(0, 0)], a.tile [(0, 1)]
+            (Tile (row = 0, col = 0, 12), Tile (row = 0, col = 1, 12))
+            >>> a.tile [(0, 2)]
+            Tile (row = 0, col = 2, 3456789)
+            >>> a = Alternatives (cages = [(3, [(0, 0), (0, 0)])])
+            Traceback (most recent call last):
+            ...
+            ValueError: Tile (0, 0) is in more than one cage
+        """
+        self.cages    = []
+        self.cage_idx = {}
+        for total, cells in cages:
+            cells = tuple (tuple (p) for p in cells)
+            for pos in cells:
+                if pos in self.cage_idx:
+                    raise ValueError \
+                        ("Tile (%s, %s) is in more than one cage" % pos)
+                self.cage_idx [pos] = len (self.cages)
+            if not sum_masks (len (cells), total):
+                raise ValueError \
+                    ( "Impossible sum %s for cage with %s tiles"
+                    % (total, len (cells))
+                    )
+            self.cages.append ((total, cells))
+    # end def init_cages
+
+    @classmethod
+    def display_rules (cls, file = None):
+        """ Print scans and hits by propagation rule, wasted scans
+            are those that did not change any tile.
+        """
+        if file is None:
+            file = sys.stdout
+        for r in cls.rules:
+            print \
+                ( "%-9s scans: %8d hits: %8d wasted: %8d"
+                % (r, cls.scans [r], cls.hits [r], cls.scans [r] - cls.hits [r])
+                , file = file
+                )
+    # end def display_rules
+
+    def unit_index (self):
+        """ Map each position to the units (iterator name, index)
+            it belongs to. This depends only on the puzzle layout and
+            is shared by all copies.
+            >>> a = Alternatives ()
+            >>> a.units [(4, 5)]
+            (('col_iter', 5), ('quadrant_iter', (1, 1)), ('row_iter', 4))
+        """
+        names = list (self.iterator_names ())
+        units = {}
+        for r in range (9):
+            for c in range (9):
+                units [(r, c)] = tuple \
+                    ( (n, idx) for n, idx in
+                      ((n, self.indexer (n) (r, c)) for n in names)
+                      if idx is not None
+                    )
+        return units
+    # end def unit_index
+
+    def schedule (self, unit):
+        """ Append unit to the worklist unless it is already queued """
+        if unit not in self.dirty:
+            self.dirty.add (unit)
+            self.queue.append (unit)
+    # end def schedule
+
     def mark_dirty (self, tile):
-        for n in self.iterator_names ():
-            idx = self.indexer (n) (*tile.pos)
-            if idx is not None:
-                self.dirty.add ((n, idx))
+        self.changes += 1
+        dirty = self.dirty
+        queue = self.queue
+        for unit in self.units [tile.pos]:
+            if unit not in dirty:
+                dirty.add (unit)
+                queue.append (unit)
     # end def mark_dirty
 
     def mark_solved (self, tile):
@@ -286,14 +491,21 @@ class Alternatives:
         """
         while self.solvable and self.pending:
             tile = self.pending.pop ()
+            self.steps += 1
             if not tile:
                 assert (not self.solvable)
                 return
+            self.scans ['eliminate'] += 1
+            changes = self.changes
             val = tile.get ()
-            for n in self.iterator_names ():
-                for s in self.iterator (n) (self.indexer (n) (*tile.pos)):
-                    if s.row != tile.row or s.col != tile.col:
+            for n, idx in self.units [tile.pos]:
+                for s in self.iterator (n) (idx):
+                    if s is not tile:
                         s.discard (val)
+                if not self.solvable:
+                    return
+            if self.changes != changes:
+                self.hits ['eliminate'] += 1
             assert (tile not in self.pending)
     # end def update
 
@@ -310,6 +522,7 @@ class Alternatives:
             >>> a = Alternatives (diagonal = True, colorconstrained = True)
             >>> for n in a.iterator_names ():
             ...     n
+            'cage_iter'
             'col_iter'
             'diag_bltr_iter'
             'diag_tlbr_iter'
@@ -331,6 +544,25 @@ class Alternatives:
         return getattr (self, name + '_idx')
     # end def indexer
 
+    def cage_iter_idx (self, row, col):
+        """ Index of the killer cage of this position """
+        if self.cage_idx:
+            return self.cage_idx.get ((row, col))
+        return None
+    # end def cage_iter_idx
+
+    def cage_iter (self, idx):
+        """ Iterate over the tiles of a killer cage
+            >>> a = Alternatives (cages = [(10, [(0, 0), (1, 0), (1, 1)])])
+            >>> idx = a.cage_iter_idx (1, 0)
+            >>> ','.join ('(%s,%s)' % t.pos for t in a.cage_iter (idx))
+            '(0,0),(1,0),(1,1)'
+        """
+        if idx is not None:
+            for pos in self.cages [idx][1]:
+                yield self.tile [pos]
+    # end def cage_iter
+
     def col_iter_idx (self, row, col):
         return col
     # end def col_iter_idx
@@ -483,37 +715,57 @@ class Alternatives:
     # related to solving:
 
     def invert (self):
-        """ We check the tiles in one row, column or quadrant.
-            If a single number is only in one of them, we remove all
-            other numbers from the Tile in that position.
-            Likewise: If two numbers are only in two tiles, remove all
-            other numbers from these two, and so on for three, four, ...
-            We record if changes were made, so the caller can decide to
-            call us again until nothing changes.
-            For the given iterator build set of positions by number.
-            Then check by cardinality n of the set:
+        """ Propagate changes until a fixpoint is reached, units (row,
+            column, quadrant, etc.) with changed tiles are processed
+            from a worklist. A unit is queued only once no matter how
+            often it is changed before it is processed. The cheap rules
+            run first: Cages are checked (see cage_check), for other
+            units we build the set of positions by number and check
+            the cardinality n of each set:
                 - if n == 0: not solvable (number not possible)
                 - if n == 1: set tile to that number
-                - 2 <= n <= 4: check other iterators (quadrants etc.) if
-                  the items found are in same iterator (set
-                  intersection). If so, remove the number from all tiles
-                  in the other iterator, except for the ones in the
-                  intersection. We don't do that for n == 1, we call
-                  self.update instead (which does the same)
-                - iterate over 2,3,... n-1 combinations of numbers and
-                  see if the union of possibilities is the same
-                  cardinality as our number of combinations. If so we
-                  can remove all other numbers from the tiles in the
-                  union.
-        """
-        while self.solvable and self.dirty:
-            itername, idx = self.dirty.pop ()
-            numbers = {}
-            for k in range (1, 10):
-                numbers [k] = set ()
-            for tile in self.iterator (itername) (idx):
-                for num in tile:
-                    numbers [num].add (tile)
+            Only when no cheap work is left the units are checked for
+            number sets (see invert_sets): If k numbers are only in k
+            tiles, remove all other numbers from these tiles. We stop
+            at the first contradiction.
+            >>> Alternatives.scans ['hidden'] = Alternatives.hits ['hidden'] = 0
+            >>> a = Alternatives ()
+            >>> for c in range (8):
+            ...     a.set (0, c, c + 1)
+            >>> a.tile [(0, 8)]
+            Tile (row = 0, col = 8, 9)
+            >>> Alternatives.scans ['hidden'] > Alternatives.hits ['hidden']
+            True
+        """
+        while self.solvable and (self.queue or self.sets_queue):
+            if not self.queue:
+                unit = self.sets_queue.popleft ()
+                self.sets_dirty.discard (unit)
+                self.steps += 1
+                self.scans ['sets'] += 1
+                changes = self.changes
+                self.invert_sets (self.unit_numbers (*unit))
+                if self.changes != changes:
+                    self.hits ['sets'] += 1
+                self.update ()
+                continue
+            unit = self.queue.popleft ()
+            self.dirty.discard (unit)
+            self.steps += 1
+            itername, idx = unit
+            if itername == 'cage_iter':
+                self.scans ['cage'] += 1
+                changes = self.changes
+                self.cage_check (idx)
+                if self.changes != changes:
+                    self.hits ['cage'] += 1
+                self.update ()
+                continue
+            if self.level < 2:
+                continue
+            self.scans ['hidden'] += 1
+            changes = self.changes
+            numbers = self.unit_numbers (itername, idx)
             for n, tiles in sorted \
                 (numbers.items (), key = lambda x: len (x [1])):
                 l = len (tiles)
@@ -521,49 +773,136 @@ class Alternatives:
                     self.solvable = False
                     Statistics.update (self.depth, invert_stop = 1)
                     return
-                elif l == 1:
-                    tile = tuple (tiles) [0]
-                    if len (tile) != 1:
-                        Statistics.update (self.depth, invert_matches = 1)
-                    tile.set    (n)
-                    self.update ()
-                    continue
-                elif l > 3:
+                elif l > 1:
                     break
-                for n2 in self.iterator_names ():
-                    if n == n2:
-                        continue
-                    indexer = self.indexer (n2)
-                    idxs = [indexer (*t.pos) for t in tiles]
-                    if not reduce \
-                        (and_, (idxs [0] == i for i in idxs [1:]), True):
-                        continue
-                        # FIXME, this is almost certainly wrongly indented
-                        for t in self.iterator (n2) (idxs [0]):
-                            if t not in tiles:
-                                tl = len (t)
-                                t.discard (n)
-                                if tl != len (t):
-                                    Statistics.update \
-                                        (self.depth, invert_matches = 1)
-            nums = [(n, s) for n, s in numbers.items () if len (s) > 1]
-            for k in range (2, len (nums) - 1):
-                for numset in combinations (nums, k):
-                    ns = set ()
-                    se = set ()
-                    for n, s in numset:
-                        ns.add (n)
-                        se.update (s)
-                    if len (se) <= k:
-                        for tile in se:
-                            for number in tile.copy ():
-                                if number not in ns:
-                                    tile.discard (number)
-                                    Statistics.update \
-                                        (self.depth, number_sets = 1)
+                tile = tuple (tiles) [0]
+                if len (tile) != 1:
+                    Statistics.update (self.depth, invert_matches = 1)
+                tile.set    (n)
+                self.update ()
+                if not self.solvable:
+                    return
+            if self.changes != changes:
+                self.hits ['hidden'] += 1
+            if self.level >= 3 and unit not in self.sets_dirty:
+                self.sets_dirty.add (unit)
+                self.sets_queue.append (unit)
             self.update ()
     # end def invert
 
+    def unit_numbers (self, itername, idx):
+        """ Map each number to the set of tiles of the given unit
+            where it is still possible.
+        """
+        numbers = {}
+        for k in range (1, 10):
+            numbers [k] = set ()
+        for tile in self.iterator (itername) (idx):
+            for num in tile:
+                numbers [num].add (tile)
+        return numbers
+    # end def unit_numbers
+
+    def invert_sets (self, numbers):
+        """ If k numbers are possible in only k tiles, remove all
+            other numbers from these tiles. The numbers dict maps each
+            number to the set of tiles (of one row, column, etc.) where
+            it is possible.
+        """
+        nums = [(n, s) for n, s in numbers.items () if len (s) > 1]
+        for k in range (2, len (nums) - 1):
+            for numset in combinations (nums, k):
+                ns = set ()
+                se = set ()
+                for n, s in numset:
+                    ns.add (n)
+                    se.update (s)
+                if len (se) <= k:
+                    for tile in se:
+                        for number in tile.copy ():
+                            if number not in ns:
+                                tile.discard (number)
+                                Statistics.update \
+                                    (self.depth, number_sets = 1)
+    # end def invert_sets
+
+    def cage_check (self, idx):
+        """ Restrict the tiles of a killer cage to the numbers of the
+            combinations that are still possible for the cage sum: These
+            must contain all solved numbers of the cage and only numbers
+            that are possible in one of the tiles.
+            >>> a = Alternatives (cages = [(17, [(0, 0), (0, 1)])])
+            >>> a.tile [(0, 0)], a.tile [(0, 1)]
+            (Tile (row = 0, col = 0, 89), Tile (row = 0, col = 1, 89))
+            >>> a = Alternatives (cages = [(12, [(0, 0), (0, 1), (0, 2)])])
+            >>> a.set (0, 0, 7)
+            >>> a.tile [(0, 1)], a.tile [(0, 2)]
+            (Tile (row = 0, col = 1, 1234), Tile (row = 0, col = 2, 1234))
+            >>> a.set (0, 1, 4)
+            >>> a.tile [(0, 2)]
+            Tile (row = 0, col = 2, 1)
+        """
+        total, cells = self.cages [idx]
+        solved   = 0
+        possible = 0
+        for pos in cells:
+            t = self.tile [pos]
+            m = sum (1 << n for n in t)
+            possible |= m
+            if len (t) == 1:
+                solved |= m
+        allowed = 0
+        for m in sum_masks (len (cells), total, ~possible, solved):
+            allowed |= m
+        if not allowed:
+            self.solvable = False
+            return
+        for pos in cells:
+            t = self.tile [pos]
+            for n in [n for n in t if not allowed & (1 << n)]:
+                t.discard (n)
+    # end def cage_check
+
+    def state (self):
+        """ Packed candidate state: One bitmask per tile in row order,
+            bit n is set if n is still possible for that tile.
+            >>> a = Alternatives ()
+            >>> a.state () [:2]
+            (1022, 1022)
+            >>> a.set (0, 0, 1)
+            >>> a.state () [:2]
+            (2, 1020)
+        """
+        return tuple \
+            ( sum (1 << n for n in self.tile [(r, c)])
+              for r in range (9) for c in range (9)
+            )
+    # end def state
+
+    def branch_tile (self):
+        """ The tile to branch on: first undecided tile in search order.
+            Returns None if all tiles are decided.
+        """
+        for t in self.tiles ():
+            if len (t) > 1:
+                return t
+        return None
+    # end def branch_tile
+
+    def children (self, tile):
+        """ Alternatives for each possible value of tile """
+        for i in sorted (tile):
+            nalt = self.copy ()
+            nalt.set (tile.row, tile.col, i)
+            yield nalt
+    # end def children
+
+    def as_bytes (self):
+        """ Solved alternatives as 81 bytes, see Puzzle.as_bytes """
+        return bytes \
+            (self.tile [(r, c)].get () for r in range (9) for c in range (9))
+    # end def as_bytes
+
     def set_remove (self):
         """ We check the tiles in one row, column or quadrant.
             If there are two identical tiles with cardinality 2 we remove
@@ -593,6 +932,44 @@ class Alternatives:
 # end class Alternatives
 
 class Puzzle:
+    """ A puzzle with its solver.
+        Up to keepmax solutions are remembered as 81 bytes (see
+        as_bytes) in the solutions attribute.
+        The search can be limited by maxnodes (number of branch
+        points), maxsteps (propagation steps, see Alternatives.steps)
+        and maxtime (seconds). If a budget is exceeded, the search stops
+        and the name of the budget is stored in the exceeded attribute,
+        solvecount, nodes and steps then contain the partial results.
+        If memo_depth is not None, the number of solutions of each
+        search state up to that depth is remembered in the class-wide
+        memo. The memo is keyed by the candidate state after
+        propagation, so different puzzles that propagate to the same
+        state share the result. This is only used when not verbose,
+        solutions found via the memo are counted but not displayed.
+        With learn the search records nogoods, sets of branch
+        decisions that cannot be part of a solution, and backjumps
+        over decisions not involved in a failure, see _learn. At most
+        nogood_size nogoods are kept, the least recently used is
+        evicted. The memo is not used when learning.
+        With restarts ('luby' or 'geometric') the branch tile is chosen
+        randomly among the tiles with the fewest possibilities (see
+        next_tile) and its values are tried least constraining first
+        with random ties (see values), the random generator is seeded
+        with seed for each solve, so results are deterministic. A search
+        run is stopped after restart_nodes branch points times the next
+        element of the Luby sequence or of a geometric sequence with
+        factor restart_factor and started again, solutions found in
+        earlier runs are not counted again. This tames heavy-tailed
+        search times when looking for the first solution (solvemax 1).
+        Nothing is kept between runs, so a search that must cover the
+        whole tree, e.g. proving uniqueness, only repeats work. The
+        memo is not used and learn is ignored with restarts.
+    """
+    memo      = {}
+    memo_size = 100000
+    memo_hits = 0
+    restart_factor = 1.5
+
     def __init__ \
         ( self
         , verbose          = True
@@ -601,6 +978,17 @@ class Puzzle:
         , diagonal         = False
         , colorconstrained = False
         , kikagaku         = False
+        , killer           = False
+        , memo_depth       = None
+        , keepmax          = 0
+        , maxnodes         = None
+        , maxsteps         = None
+        , maxtime          = None
+        , learn            = False
+        , nogood_size      = 1000
+        , restarts         = None
+        , restart_nodes    = 30
+        , seed             = 42
         ):
         x = [0] * 9
         self.puzzle           = [copy (x) for i in range (9)]
@@ -613,10 +1001,56 @@ class Puzzle:
         self.kikagaku         = None
         self.runtime          = 0.0
         self.count            = 0
+        self.memo_depth       = memo_depth
+        self.keepmax          = keepmax
+        self.solutions        = []
+        self.maxnodes         = maxnodes
+        self.maxsteps         = maxsteps
+        self.maxtime          = maxtime
+        self.nodes            = 0
+        self.steps            = 0
+        self.exceeded         = None
+        self.cages            = None
+        self.learn            = learn
+        self.nogood_size      = nogood_size
+        self.nogoods          = {}
+        self.learned          = 0
+        self.restarts         = restarts
+        self.restart_nodes    = restart_nodes
+        self.seed             = seed
+        self.random           = None
+        self.seen             = None
+        self.restart_at       = None
+        self.runs             = 0
         if kikagaku:
             self.kikagaku     = [copy (x) for i in range (9)]
+        if killer:
+            self.cages        = []
     # end def __init__
 
+    @classmethod
+    def from_bytes (cls, buf, **kw):
+        """ Compact constructor: buf contains 81 numbers row by row,
+            zero is an empty tile. Keyword args are passed to __init__.
+            >>> p = Puzzle.from_bytes (bytes (range (9)) * 9)
+            >>> p.count
+            72
+            >>> p.puzzle [3]
+            [0, 1, 2, 3, 4, 5, 6, 7, 8]
+            >>> p.as_bytes () == bytes (range (9)) * 9
+            True
+        """
+        puzzle = cls (**kw)
+        puzzle.puzzle = [list (buf [r:r + 9]) for r in range (0, 81, 9)]
+        puzzle.count  = 81 - bytes (buf).count (0)
+        return puzzle
+    # end def from_bytes
+
+    def as_bytes (self):
+        """ Return puzzle as 81 bytes, inverse of from_bytes """
+        return bytes (n for row in self.puzzle for n in row)
+    # end def as_bytes
+
     def set (self, x, y, value):
         if self.puzzle [x][y] != 0:
             self.count -= 1
@@ -635,193 +1069,592 @@ class Puzzle:
                 line = file.readline ()
                 for c in range (9):
                     self.kikagaku [r][c] = line [c]
+        if self.cages is not None:
+            self.cages_from_file (file)
     # end def from_file
 
+    def cages_from_file (self, file):
+        """ Read killer cages: 9 lines with a letter for each tile
+            denoting its cage ('.' for tiles not in a cage) followed by
+            one line per cage with the letter and the sum of the cage.
+            >>> from io import StringIO
+            >>> p = Puzzle (killer = True)
+            >>> lines = ['aab......'] + ['.........'] * 8 + ['a 3', 'b 9']
+            >>> f = StringIO ('\\n'.join (lines))
+            >>> p.cages_from_file (f)
+            >>> p.cages
+            [(3, ((0, 0), (0, 1))), (9, ((0, 2),))]
+        """
+        cells = {}
+        for r in range (9):
+            line = file.readline ()
+            for c in range (9):
+                if line [c] != '.':
+                    cells.setdefault (line [c], []).append ((r, c))
+        sums = {}
+        for line in file:
+            if not line.strip ():
+                break
+            letter, total = line.split ()
+            sums [letter] = int (total)
+        self.cages = []
+        for letter in sorted (cells):
+            if letter not in sums:
+                raise ValueError ("No sum for cage %s" % letter)
+            self.cages.append ((sums [letter], tuple (cells [letter])))
+    # end def cages_from_file
+
     def display (self, file = None):
+        from sudokumaker import render
         if file is None:
             file = sys.stdout
-        for r in range (9):
-            print \
-                (''.join \
-                    ([chr (self.puzzle [r][c] + ord ('0')) for c in range (9)])
-                , file = file
-                )
-        print (file = file)
+        file.write (render.text.puzzle (self))
     # end def display
 
-    def as_tex (self, date = None, title = "", author = None):
-        """ Output as TeX code
-        """
-        if not author:
-            author = 'Sudoku-Maker by Ralf Schlatterbeck'
-        if not date:
-            date = time.strftime ('%Y-%m-%d')
-        print \
-            ( dedent
-                (   r"""
-                    \documentclass[12pt]{article}
-                    \usepackage{xcolor}
-                    """
-                )
-            )
-        if self.colorconstrained or self.kikagaku:
-            print \
-                ( dedent
-                    (   r"""
-                        \definecolor{sred}{HTML}{FAB3BA}
-                        \definecolor{sviolet}{HTML}{EDD4FF}
-                        \definecolor{sgrey}{HTML}{DFDDD8}
-                        \definecolor{sorange}{HTML}{F3CE82}
-                        \definecolor{spink}{HTML}{F1A1DC}
-                        \definecolor{syellow}{HTML}{F6FC7B}
-                        \definecolor{slgreen}{HTML}{C8FBAE}
-                        \definecolor{sdgreen}{HTML}{99EECD}
-                        \definecolor{sblue}{HTML}{A4DFF2}
-                    """
-                    )
-                )
-            colors = [ ['sred',    'spink',   'sviolet']
-                     , ['sgrey',   'sorange', 'syellow']
-                     , ['slgreen', 'sdgreen', 'sblue']
-                     ]
-        if self.kikagaku:
-            colors = dict \
-                ( r = 'sred',    p = 'spink',   v = 'sviolet'
-                , g = 'sgrey',   o = 'sorange', y = 'syellow'
-                , l = 'slgreen', d = 'sdgreen', b = 'sblue'
-                )
-            kik_color = {}
-            col_idx   = {}
-            alt = Alternatives (self.puzzle, kikagaku = self.kikagaku)
-            for c, idx in alt.kikagaku_color.items ():
-                if c in colors:
-                    kik_color [c] = colors [c]
-                    col_idx   [colors [c]] = idx
-            free = sorted ([c for c in colors.values () if c not in col_idx])
-            for c, idx in alt.kikagaku_color.items ():
-                if c not in kik_color:
-                    kik_color [c] = free.pop ()
-
-        print \
-            ( dedent \
-                (   r"""
-                    \date{%s}
-                    \author{%s}
-                    \title{%s}
-                    \begin{document}
-                    \maketitle
-                    \thispagestyle{empty}
-                    \Huge
-                    \begin{center}
-                    \newlength{\w}\setlength{\w}{3ex}
-                    \setlength{\fboxsep}{0pt}
-                    \begin{tabular}%%
-                     {@{}|@{}p{\w}@{}|@{}p{\w}@{}|@{}p{\w}@{}|
-                         |@{}p{\w}@{}|@{}p{\w}@{}|@{}p{\w}@{}|
-                         |@{}p{\w}@{}|@{}p{\w}@{}|@{}p{\w}@{}|@{}}
-                    """ % (date, author, title)
-                )
-            )
+    def tex_preamble (self):
+        """ Document class, packages and color definitions """
+        from sudokumaker import render
+        return render.tex.preamble (self.colorconstrained or self.kikagaku)
+    # end def tex_preamble
 
-        bgcolor = diagcolor = 'white'
-        bg = [bgcolor, bgcolor, bgcolor]
-        if self.diagonal:
-            diagcolor = 'yellow'
-        dg = [diagcolor, diagcolor, diagcolor]
-        for r in range (9):
-            print (r"\hline")
-            if r % 3 == 0 and r and not self.kikagaku:
-                print (r"\hline")
-            if self.colorconstrained:
-                bg = colors [r % 3]
-                if not self.diagonal:
-                    dg = colors [r % 3]
-            if self.kikagaku:
-                print \
-                    ('&'.join \
-                        ( r"\colorbox{%s}{\hbox to\w{\hfil\strut %s\hfil}}"
-                        % (kik_color [self.kikagaku [r][c]], p or '')
-                          for c, p in enumerate (self.puzzle [r])
-                        )
-                    )
-            else:
-                print \
-                    ( '&'.join \
-                        ( r"\colorbox{%s}{\hbox to\w{\hfil\strut %s\hfil}}"
-                        % ( [bg [n % 3], dg [n % 3]][r == n or r == 8 - n]
-                          , p or ''
-                          )
-                        for n, p in enumerate (self.puzzle [r])
-                        )
-                    , end = ' '
-                    )
-            print (r"\\")
-        print \
-            ( dedent \
-                (   r"""
-                    \hline
-                    \end{tabular}
-                    \end{center}
-                    \end{document}
-                    """
-                )
+    def tex_table (self):
+        """ The puzzle as a LaTeX tabular, see render.Tex_Renderer """
+        from sudokumaker import render
+        return render.tex.puzzle (self)
+    # end def tex_table
+
+    def as_tex (self, date = None, title = "", author = None, file = None):
+        """ Output as TeX code, the document is built in memory and
+            written with a single call.
+        """
+        from sudokumaker import render
+        render.tex.render \
+            ( (self,), file
+            , date    = date
+            , title   = title
+            , author  = author
+            , colored = self.colorconstrained or self.kikagaku
             )
     # end def as_tex
 
-    def solve (self):
+    def solve (self, alt = None):
+        """ Search for solutions, alt may be the already propagated
+            Alternatives of self.puzzle, it is not modified. The puzzle
+            is restored after the search, also if a budget is exceeded.
+            >>> p = Puzzle (verbose = False, solvemax = 50, maxnodes = 3)
+            >>> p.solve ()
+            >>> p.exceeded, p.puzzle [0]
+            ('nodes', [0, 0, 0, 0, 0, 0, 0, 0, 0])
+        """
         self.solvecount = 0
-        if self.do_time:
-            before = time.time ()
-        self._solve \
-            (Alternatives 
-                (self.puzzle
+        self.solutions  = []
+        self.nodes      = 0
+        self.steps      = 0
+        self.exceeded   = None
+        self.started    = time.time ()
+        self.pool       = {}
+        if alt is None:
+            alt = Alternatives \
+                ( self.puzzle
                 , diagonal         = self.diagonal
                 , colorconstrained = self.colorconstrained
                 , kikagaku         = self.kikagaku
+                , cages            = self.cages
                 )
-            )
+        self.steps += alt.steps
+        self.root       = alt
+        self.decisions  = []
+        self.on_path    = {}
+        self.nogoods    = {}
+        self.watch      = {}
+        self.learned    = 0
+        self.runs       = 0
+        saved           = [list (r) for r in self.puzzle]
+        try:
+            if self.restarts:
+                self._restart (alt)
+            else:
+                self._solve (alt)
+        except Budget_Exceeded as exc:
+            self.exceeded = exc.args [0]
+        finally:
+            # An aborted search leaves its branch values in the puzzle
+            for row, values in zip (self.puzzle, saved):
+                row [:] = values
         if self.do_time:
-            self.runtime = time.time () - before
+            self.runtime = time.time () - self.started
         if self.verbose:
+            if self.exceeded:
+                print ("Budget exceeded (%s)" % self.exceeded)
             print ("No (more) solutions")
             if self.do_time:
                 print ("runtime: %s" % self.runtime)
     # end def solve
 
+    def iter_solutions (self):
+        """ Yield up to solvemax solutions as 81 bytes (see as_bytes),
+            the search proceeds only when the next solution is
+            requested. The search uses an explicit stack, memory is
+            bounded by the search depth. Nothing is printed and the
+            memo is not used, solvecount, nodes, steps and exceeded are
+            updated as in solve and the first keepmax solutions are
+            remembered in solutions. The solutions are the same as
+            those of solve but may come in a different order.
+            >>> s = '000720800741003260200050300407090000010000080'
+            >>> s += '600008900100000450050840706070069002'
+            >>> p = Puzzle.from_bytes (bytes (int (c) for c in s))
+            >>> p.puzzle [0][0] = 0
+            >>> [bytes (c + 48 for c in s [:9]) for s in p.iter_solutions ()]
+            [b'536724819']
+            >>> p = Puzzle (verbose = False, solvemax = 3, keepmax = 3)
+            >>> it = p.iter_solutions ()
+            >>> next (it) [:9]
+            b'\\x01\\x02\\x03\\x04\\x05\\x06\\x07\\x08\\t'
+            >>> s = [next (it)] + list (it)
+            >>> len (s), p.solvecount, len (p.solutions)
+            (2, 3, 3)
+        """
+        self.solvecount = 0
+        self.solutions  = []
+        self.nodes      = 0
+        self.steps      = 0
+        self.exceeded   = None
+        self.started    = time.time ()
+        alt = Alternatives \
+            ( self.puzzle
+            , diagonal         = self.diagonal
+            , colorconstrained = self.colorconstrained
+            , kikagaku         = self.kikagaku
+            , cages            = self.cages
+            )
+        self.steps += alt.steps
+        stack = [alt]
+        while stack and self.solvecount < self.solvemax:
+            alt = stack.pop ()
+            if not alt.solvable:
+                continue
+            tile = alt.branch_tile ()
+            if tile is None:
+                self.solvecount += 1
+                s = alt.as_bytes ()
+                if len (self.solutions) < self.keepmax:
+                    self.solutions.append (s)
+                yield s
+                continue
+            self.nodes += 1
+            try:
+                self.check_budget ()
+            except Budget_Exceeded as exc:
+                self.exceeded = exc.args [0]
+                return
+            children = list (alt.children (tile))
+            self.steps += sum (a.steps for a in children)
+            stack.extend (reversed (children))
+    # end def iter_solutions
+
+    def spill (self, filename):
+        """ Write solutions to a gzip compressed file, one line of 81
+            digits per solution. The last line is a comment with the
+            number of solutions and the exceeded budget, if any (the
+            count is only known at the end). Returns the number of
+            solutions.
+            >>> import os, tempfile
+            >>> fn = os.path.join (tempfile.mkdtemp (), 's.gz')
+            >>> Puzzle (verbose = False, solvemax = 3).spill (fn)
+            3
+            >>> len (list (Puzzle.read_spill (fn))), Puzzle.spill_count (fn)
+            (3, (3, None))
+        """
+        import gzip
+        with gzip.open (filename, 'wt') as f:
+            for s in self.iter_solutions ():
+                f.write (''.join (str (n) for n in s))
+                f.write ('\n')
+            f.write ('# solutions: %d' % self.solvecount)
+            if self.exceeded:
+                f.write (' exceeded: %s' % self.exceeded)
+            f.write ('\n')
+        return self.solvecount
+    # end def spill
+
+    @staticmethod
+    def read_spill (filename):
+        """ Yield the solutions of a file written by spill as bytes """
+        import gzip
+        with gzip.open (filename, 'rt') as f:
+            for line in f:
+                if line.startswith ('#'):
+                    continue
+                yield bytes (int (c) for c in line.strip ())
+    # end def read_spill
+
+    @staticmethod
+    def spill_count (filename):
+        """ Number of solutions and exceeded budget (or None) recorded
+            at the end of a file written by spill.
+        """
+        import gzip
+        count = exceeded = None
+        with gzip.open (filename, 'rt') as f:
+            for line in f:
+                if line.startswith ('#'):
+                    words    = line [1:].split ()
+                    count    = int (words [1])
+                    exceeded = words [3] if len (words) > 3 else None
+        return count, exceeded
+    # end def spill_count
+
+    def check_budget (self):
+        """ Raise Budget_Exceeded if one of the budgets is used up """
+        if self.maxnodes is not None and self.nodes > self.maxnodes:
+            raise Budget_Exceeded ('nodes')
+        if self.maxsteps is not None and self.steps > self.maxsteps:
+            raise Budget_Exceeded ('steps')
+        if  (   self.maxtime is not None
+            and time.time () - self.started > self.maxtime
+            ):
+            raise Budget_Exceeded ('time')
+    # end def check_budget
+
+    def memo_key (self, alt):
+        """ Key into memo: Candidate state and the active constraints """
+        kik = cages = None
+        if self.kikagaku:
+            kik = tuple (tuple (r) for r in self.kikagaku)
+        if self.cages:
+            cages = tuple (self.cages)
+        return \
+            (self.diagonal, self.colorconstrained, kik, cages, alt.state ())
+    # end def memo_key
+
+    @classmethod
+    def memo_store (cls, key, count, complete):
+        """ Store solution count for key, complete is True if count
+            is the total number of solutions (not truncated by solvemax).
+            When the memo is full the oldest entry is evicted.
+        """
+        old = cls.memo.get (key)
+        if old is not None and (old [1] or old [0] >= count):
+            return
+        if old is None and len (cls.memo) >= cls.memo_size:
+            del cls.memo [next (iter (cls.memo))]
+        cls.memo [key] = (count, complete)
+    # end def memo_store
+
+    def _restart (self, alt):
+        """ Search runs with randomized value order, each limited to
+            the next node budget of the restart schedule.
+        """
+        self.random = random.Random (self.seed)
+        self.seen   = set ()
+        saved       = [list (r) for r in self.puzzle]
+        try:
+            while True:
+                self.runs += 1
+                if self.restarts == 'luby':
+                    limit = self.restart_nodes * luby (self.runs)
+                else:
+                    limit = int \
+                        ( self.restart_nodes
+                        * self.restart_factor ** (self.runs - 1)
+                        )
+                self.restart_at = self.nodes + limit
+                try:
+                    self._solve (alt)
+                except Restart:
+                    for row, values in zip (self.puzzle, saved):
+                        row [:] = values
+                    continue
+                break
+        finally:
+            self.random = self.seen = self.restart_at = None
+    # end def _restart
+
     def _solve (self, alt, depth = 0):
         if self.solvecount >= self.solvemax:
             return
         if not alt.solvable:
             return
-        v = None
+        if self.random:
+            self._search (alt, depth)
+            return
+        if self.learn:
+            self._learn (alt, depth)
+            return
+        if  (   self.verbose
+            or  self.memo_depth is None
+            or  depth > self.memo_depth
+            ):
+            self._search (alt, depth)
+            return
+        key  = self.memo_key (alt)
+        need = self.solvemax - self.solvecount
+        hit  = self.memo.get (key)
+        if hit is not None and (hit [1] or hit [0] >= need):
+            self.__class__.memo_hits += 1
+            self.solvecount += min (hit [0], need)
+            return
+        before = self.solvecount
+        self._search (alt, depth)
+        count  = self.solvecount - before
+        self.memo_store (key, count, self.solvecount < self.solvemax)
+    # end def _solve
+
+    def board (self, alt, depth):
+        """ Alternatives for a child of alt at search depth depth.
+            The search needs only one board per depth at a time, these
+            are kept in self.pool and reset in place from alt.
+        """
+        nalt = self.pool.get (depth)
+        if nalt is None:
+            nalt = self.pool [depth] = alt.copy ()
+        else:
+            alt.copy_into (nalt)
+        return nalt
+    # end def board
+
+    def next_tile (self, alt):
+        """ Next tile to branch on: A tile with several possibilities
+            or a solved tile not yet recorded in the puzzle, None if
+            the puzzle is solved. With restarts a random one of the
+            tiles with the fewest possibilities is chosen.
+        """
+        ties = []
         for x in alt.tiles ():
             assert (x)
-            if len (x) == 1 and not self.puzzle [x.row][x.col] or len (x) > 1:
-                v = x
-                break
-        if v is None:
+            if len (x) == 1 and not self.puzzle [x.row][x.col]:
+                return x
+            if len (x) > 1:
+                if not self.random:
+                    return x
+                if ties and len (x) > len (ties [0]):
+                    break
+                ties.append (x)
+        if ties:
+            return self.random.choice (ties)
+        return None
+    # end def next_tile
+
+    def found (self):
+        """ Record solution in self.puzzle """
+        if self.verbose:
+            print ("Solved (%s):" % (self.solvecount + 1))
+            self.display ()
+        if len (self.solutions) < self.keepmax:
+            self.solutions.append (self.as_bytes ())
+        self.solvecount += 1
+        if self.solvecount >= self.solvemax:
             if self.verbose:
-                print ("Solved (%s):" % (self.solvecount + 1))
-                self.display ()
-            self.solvecount += 1
-            if self.solvecount >= self.solvemax:
-                if self.verbose:
-                    print ("Max. solutions (%d) reached" % self.solvemax)
+                print ("Max. solutions (%d) reached" % self.solvemax)
+    # end def found
+
+    def values (self, alt, tile):
+        """ The values of tile in the order to try them: Without
+            restarts in set order, otherwise the value occurring in the
+            fewest other tiles of the row, column etc. first, ties are
+            broken randomly.
+            >>> p = Puzzle (restarts = 'luby')
+            >>> p.random = random.Random (1)
+            >>> a = Alternatives ()
+            >>> for c in range (1, 9):
+            ...     a.tile [(0, c)].discard (9)
+            >>> p.values (a, a.tile [(0, 0)]) [0]
+            9
+        """
+        if not self.random:
+            return tile
+        peers = \
+            [ t for name, idx in alt.units [tile.pos]
+                for t in alt.iterator (name) (idx) if t is not tile
+            ]
+        vals = list (tile)
+        self.random.shuffle (vals)
+        return sorted (vals, key = lambda i: sum (i in t for t in peers))
+    # end def values
+
+    def _search (self, alt, depth):
+        v = self.next_tile (alt)
+        if v is None:
+            if self.seen is not None:
+                solution = self.as_bytes ()
+                if solution in self.seen:
+                    return
+                self.seen.add (solution)
+            self.found ()
             return
         old = self.puzzle [v.row][v.col]
         Statistics.update (depth, branches = len (v))
-        for i in v:
-            nalt = alt.copy ()
+        if len (v) > 1:
+            self.nodes += 1
+            self.check_budget ()
+            if self.restart_at is not None and self.nodes > self.restart_at:
+                raise Restart ()
+        for i in self.values (alt, v):
+            nalt = self.board (alt, depth + 1)
             self.puzzle [v.row][v.col] = i
             nalt.set    (v.row, v.col, i)
+            self.steps += nalt.steps
             #print (v.row, v.col)
             #self.display ()
             self._solve (nalt, depth = depth + 1)
         self.puzzle [v.row][v.col] = old
-    # end def _solve
+    # end def _search
+
+    def _learn (self, alt, depth):
+        """ Search with nogood learning and backjumping. Branch
+            decisions are numbered by their level, the position in
+            self.decisions. Returns None if solutions were found (or
+            solvemax is reached), otherwise the conflict: The set of
+            levels of the decisions that together rule out all
+            solutions below alt. A failed propagation is reduced to a
+            minimal set of decisions (see conflict). If the conflict of
+            a child does not contain our own decision, the other values
+            fail for the same reason and are skipped (backjump). If all
+            values fail, the union of the conflicts without our own
+            level is a new nogood. Values of v that were already
+            removed by propagation count as failed children.
+            >>> s = '000720800741003260200050300407090000010000080'
+            >>> s += '600008900100000450050840706070069002'
+            >>> p = Puzzle.from_bytes \\
+            ...     (bytes (int (c) for c in s), verbose = False)
+            >>> p.puzzle [0][0] = p.puzzle [8][8] = p.puzzle [4][4] = 0
+            >>> p.solve ()
+            >>> l = Puzzle.from_bytes \\
+            ...     (p.as_bytes (), verbose = False, learn = True)
+            >>> l.solve ()
+            >>> l.solvecount == p.solvecount, l.nodes <= p.nodes
+            (True, True)
+        """
+        v = self.next_tile (alt)
+        if v is None:
+            self.found ()
+            return None
+        old = self.puzzle [v.row][v.col]
+        Statistics.update (depth, branches = len (v))
+        if len (v) == 1:
+            # Already decided by propagation, not a branch point
+            nalt = self.board (alt, depth + 1)
+            self.puzzle [v.row][v.col] = v.get ()
+            nalt.set (v.row, v.col, v.get ())
+            self.steps += nalt.steps
+            result = self._learn (nalt, depth + 1)
+            self.puzzle [v.row][v.col] = old
+            return result
+        self.nodes += 1
+        self.check_budget ()
+        level    = len (self.decisions)
+        conflict = set ()
+        found    = False
+        for i in v:
+            if self.solvecount >= self.solvemax:
+                break
+            lit = (v.pos, i)
+            self.decisions.append (lit)
+            self.on_path [lit] = level
+            c = self.nogood_conflict (lit)
+            if c is None:
+                nalt = self.board (alt, depth + 1)
+                self.puzzle [v.row][v.col] = i
+                nalt.set    (v.row, v.col, i)
+                self.steps += nalt.steps
+                if nalt.solvable:
+                    c = self._learn (nalt, depth + 1)
+                else:
+                    c = self.conflict ()
+            del self.on_path [lit]
+            self.decisions.pop ()
+            if c is None:
+                found = True
+            elif level not in c:
+                self.puzzle [v.row][v.col] = old
+                return c
+            else:
+                conflict.update (c)
+        self.puzzle [v.row][v.col] = old
+        if found or self.solvecount >= self.solvemax:
+            return None
+        # Values already removed from v by propagation fail, too
+        for i in self.root.tile [v.pos] - v:
+            lit = (v.pos, i)
+            self.decisions.append (lit)
+            self.on_path [lit] = level
+            c = self.nogood_conflict (lit)
+            if c is None:
+                c = self.conflict ()
+            del self.on_path [lit]
+            self.decisions.pop ()
+            conflict.update (c)
+        conflict.discard (level)
+        self.nogood_store (conflict)
+        return conflict
+    # end def _learn
+
+    def fails (self, decisions):
+        """ True if the root puzzle with the given decisions (pairs of
+            position and value) propagates to a contradiction.
+        """
+        alt = self.board (self.root, -1)
+        for pos, val in decisions:
+            alt.tile [pos].set (val)
+            if not alt.solvable:
+                break
+        else:
+            alt.update ()
+            alt.invert ()
+        self.steps += alt.steps
+        return not alt.solvable
+    # end def fails
+
+    def conflict (self):
+        """ Propagation of the current decisions failed: Reduce them
+            to a minimal failing set by trying to leave out each
+            decision, newest first, and learn the result as a nogood.
+            Returns the levels of the remaining decisions.
+        """
+        core = list (range (len (self.decisions)))
+        for level in reversed (core [:-1]):
+            trial = [l for l in core if l != level]
+            if self.fails (self.decisions [l] for l in trial):
+                core = trial
+        conflict = set (core)
+        self.nogood_store (conflict)
+        return conflict
+    # end def conflict
+
+    def nogood_store (self, conflict):
+        """ Remember the decisions at the given levels as a nogood """
+        key = tuple (sorted (self.decisions [l] for l in conflict))
+        if not key or key in self.nogoods:
+            return
+        if len (self.nogoods) >= self.nogood_size:
+            old = next (iter (self.nogoods))
+            del self.nogoods [old]
+            for lit in old:
+                self.watch [lit].discard (old)
+        self.nogoods [key] = True
+        for lit in key:
+            self.watch.setdefault (lit, set ()).add (key)
+        self.learned += 1
+    # end def nogood_store
+
+    def nogood_conflict (self, lit):
+        """ Check if the new decision lit completes a nogood, if so
+            return the levels of its decisions.
+        """
+        for key in self.watch.get (lit, ()):
+            levels = [self.on_path.get (l) for l in key]
+            if None not in levels:
+                # Most recently used goes to the end
+                del self.nogoods [key]
+                self.nogoods [key] = True
+                return set (levels)
+        return None
+    # end def nogood_conflict
 # end class Puzzle
 
 def main (argv = None):
+    # Imported here to keep the module cheap to import as a library
+    from argparse import ArgumentParser
     cmd = ArgumentParser ()
     cmd.add_argument \
         ( "file"
@@ -839,12 +1672,30 @@ def main (argv = None):
         , help    = "Add diagonality constraint"
         , action  = "store_true"
         )
+    cmd.add_argument \
+        ( "-j", "--jobs"
+        , dest    = "jobs"
+        , help    = "Parallel search with this number of processes"
+        , type    = int
+        )
     cmd.add_argument \
         ( "-k", "--kikagaku"
         , dest    = "kikagaku"
         , help    = "Kikagaku with color areas, read additional color defs"
         , action  = "store_true"
         )
+    cmd.add_argument \
+        ( "-K", "--killer"
+        , dest    = "killer"
+        , help    = "Killer sudoku, read additional cage defs"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-l", "--learn"
+        , dest    = "learn"
+        , help    = "Search with nogood learning and backjumping"
+        , action  = "store_true"
+        )
     cmd.add_argument \
         ( "-m", "--solvemax"
         , dest    = "solvemax"
@@ -852,6 +1703,62 @@ def main (argv = None):
         , type    = int
         , default = 100
         )
+    cmd.add_argument \
+        ( "-n", "--maxnodes"
+        , dest    = "maxnodes"
+        , help    = "Stop search after this number of branch points"
+        , type    = int
+        )
+    cmd.add_argument \
+        ( "-p", "--maxsteps"
+        , dest    = "maxsteps"
+        , help    = "Stop search after this number of propagation steps"
+        , type    = int
+        )
+    cmd.add_argument \
+        ( "-o", "--spill"
+        , dest    = "spill"
+        , help    = "Write solutions to this gzip compressed file (one line"
+                    " per solution) instead of printing them"
+        )
+    cmd.add_argument \
+        ( "-P", "--profile"
+        , dest    = "profile"
+        , help    = "Profile the solver and write the result to this file,"
+                    " Chrome trace events if the name ends in .json,"
+                    " collapsed stacks for flamegraph.pl otherwise"
+        )
+    cmd.add_argument \
+        ( "--profile-sample"
+        , dest    = "profile_sample"
+        , help    = "Time only every n-th call of each profiled method,"
+                    " default=%(default)s"
+        , type    = int
+        , default = 1
+        )
+    cmd.add_argument \
+        ( "-r", "--restarts"
+        , dest    = "restarts"
+        , help    = "Randomized value order with restarts of the search"
+                    " after a node budget following a 'luby' or"
+                    " 'geometric' schedule"
+        , choices = ('luby', 'geometric')
+        )
+    cmd.add_argument \
+        ( "--restart-nodes"
+        , dest    = "restart_nodes"
+        , help    = "Node budget of the first search run with --restarts,"
+                    " default=%(default)s"
+        , type    = int
+        , default = 30
+        )
+    cmd.add_argument \
+        ( "-S", "--seed"
+        , dest    = "seed"
+        , help    = "Random seed for --restarts, default=%(default)s"
+        , type    = int
+        , default = 42
+        )
     cmd.add_argument \
         ( "-s", "--statistics"
         , dest    = "do_stats"
@@ -864,6 +1771,12 @@ def main (argv = None):
         , help    = "Runtime measurement"
         , action  = "store_true"
         )
+    cmd.add_argument \
+        ( "-T", "--maxtime"
+        , dest    = "maxtime"
+        , help    = "Stop search after this number of seconds"
+        , type    = float
+        )
     cmd.add_argument \
         ( "-v", "--version"
         , help    = "Display version"
@@ -877,18 +1790,62 @@ def main (argv = None):
     if args.do_stats:
         for d in range (81):
             Statistics (d)
-    x = Puzzle \
+    cls = Puzzle
+    kw  = {}
+    if args.jobs:
+        from sudokumaker.parallel import Parallel_Puzzle
+        cls = Parallel_Puzzle
+        kw  = dict (jobs = args.jobs)
+        unsupported = \
+            [ name for name, value in
+                ( ('--maxnodes', args.maxnodes)
+                , ('--maxsteps', args.maxsteps)
+                , ('--maxtime',  args.maxtime)
+                , ('--learn',    args.learn)
+                , ('--restarts', args.restarts)
+                )
+              if value
+            ]
+        if unsupported:
+            cmd.error \
+                ( "%s not supported with the parallel search (--jobs)"
+                % ', '.join (unsupported)
+                )
+    x = cls \
         ( diagonal         = args.diagonal
         , colorconstrained = args.colorconstrained
         , kikagaku         = args.kikagaku
+        , killer           = args.killer
         , do_time          = args.do_time
         , solvemax         = args.solvemax
+        , maxnodes         = args.maxnodes
+        , maxsteps         = args.maxsteps
+        , maxtime          = args.maxtime
+        , learn            = args.learn
+        , restarts         = args.restarts
+        , restart_nodes    = args.restart_nodes
+        , seed             = args.seed
+        , **kw
         )
     x.from_file (file)
     #x.display   ()
-    x.solve     ()
+    if args.profile:
+        from sudokumaker.profiler import Profiler, solver_spans
+        profiler = Profiler (args.profile_sample)
+        profiler.enable (solver_spans (globals ()))
+    if args.spill:
+        x.spill (args.spill)
+        print ("%d solutions written to %s" % (x.solvecount, args.spill))
+        if x.exceeded:
+            print ("Budget exceeded (%s)" % x.exceeded)
+    else:
+        x.solve ()
+    if args.profile:
+        profiler.disable ()
+        profiler.write (args.profile)
     if args.do_stats:
         Statistics.display ()
+        Alternatives.display_rules ()
 # end def main
 
 if __name__ == '__main__':
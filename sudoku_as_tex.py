@@ -20,23 +20,162 @@
 # ****************************************************************************
 
 import sys
-import os
+from   io                  import StringIO
 from   argparse            import ArgumentParser
 from   sudokumaker.sudoku  import Puzzle
+from   sudokumaker.render  import tex
 from   sudokumaker.Version import VERSION
 
+# Font size by number of columns of a page
+font_sizes = {1: r'\Huge', 2: r'\Large', 3: r'\normalsize'}
+
+def read_blocks (file):
+    """ Yield the lines of each puzzle in file, puzzles are separated
+        by blank lines.
+    """
+    block = []
+    for line in file:
+        if line.strip ():
+            block.append (line)
+        elif block:
+            yield block
+            block = []
+    if block:
+        yield block
+# end def read_blocks
+
+def read_puzzles (file, **kw):
+    """ Yield all puzzles in file, puzzles are separated by blank lines.
+        Keyword arguments are passed to Puzzle.
+        >>> f = StringIO ('\\n'.join (['1' * 9] * 9 + [''] + ['2' * 9] * 9))
+        >>> [p.puzzle [0][0] for p in read_puzzles (f)]
+        [1, 2]
+    """
+    for block in read_blocks (file):
+        yield puzzle_from_lines (block, **kw)
+# end def read_puzzles
+
+def puzzle_from_lines (lines, **kw):
+    p = Puzzle (**kw)
+    p.from_file (StringIO (''.join (lines)))
+    return p
+# end def puzzle_from_lines
+
+def solution (puzzle):
+    """ Return a puzzle with the (first) solution of puzzle or None """
+    s = Puzzle \
+        ( verbose          = False
+        , solvemax         = 1
+        , keepmax          = 1
+        , diagonal         = puzzle.diagonal
+        , colorconstrained = puzzle.colorconstrained
+        )
+    s.puzzle   = puzzle.puzzle
+    s.kikagaku = puzzle.kikagaku
+    s.cages    = puzzle.cages
+    s.solve ()
+    if not s.solvecount:
+        return None
+    return Puzzle.from_bytes \
+        ( s.solutions [0]
+        , diagonal         = puzzle.diagonal
+        , colorconstrained = puzzle.colorconstrained
+        )
+# end def solution
+
+def pages (s, puzzles, captions, per_page, columns):
+    """ Append pages with per_page puzzles arranged in columns to s """
+    width = 0.95 / columns
+    size  = font_sizes.get (columns, r'\small')
+    for start in range (0, len (puzzles), per_page):
+        s.append ("\\clearpage\n\\begin{center}\n%s\n" % size)
+        s.append ("\\setlength{\\w}{3ex}\n")
+        for n in range (start, min (start + per_page, len (puzzles))):
+            if n > start and (n - start) % columns == 0:
+                s.append ("\\par\\vspace{3ex}\n")
+            s.append \
+                ("\\begin{minipage}[t]{%.3f\\linewidth}\\centering\n" % width)
+            if puzzles [n] is not None:
+                s.append (tex.puzzle (puzzles [n]))
+            s.append ("\\par\\normalsize %s\n" % captions [n])
+            s.append ("\\end{minipage}\\hfill\n")
+        s.append ("\\end{center}\n")
+# end def pages
+
+def booklet \
+    ( puzzles
+    , file      = None
+    , per_page  = 4
+    , columns   = None
+    , solutions = False
+    , date      = None
+    , title     = ''
+    , author    = None
+    ):
+    """ Render many puzzles into one TeX document with per_page
+        puzzles on each page, optionally followed by solution pages.
+        The document is built in memory and written with one call,
+        so the TeX toolchain runs once per booklet.
+    """
+    if file is None:
+        file = sys.stdout
+    if not columns:
+        columns = 1
+        while columns * columns < per_page:
+            columns += 1
+    puzzles = list (puzzles)
+    if not puzzles:
+        return
+    colored = any (p.colorconstrained or p.kikagaku for p in puzzles)
+    s = \
+        [ tex.header
+            (date = date, title = title, author = author, colored = colored)
+        ]
+    captions = ["%d" % (n + 1) for n in range (len (puzzles))]
+    pages (s, puzzles, captions, per_page, columns)
+    if solutions:
+        solved = []
+        for n, p in enumerate (puzzles):
+            sol = solution (p)
+            if sol is not None:
+                sol.kikagaku = p.kikagaku
+            solved.append (sol)
+            if sol is None:
+                captions [n] = "%d: no solution" % (n + 1)
+            else:
+                captions [n] = "Solution %d" % (n + 1)
+        pages (s, solved, captions, per_page, columns)
+    s.append (tex.footer ())
+    file.write (''.join (s))
+# end def booklet
+
 def main (argv = None):
     cmd    = ArgumentParser ()
     cmd.add_argument \
         ( "file"
-        , help    = "File name of sudoku file, default stdin"
-        , nargs   = '?'
+        , help    = "File name(s) of sudoku files, default stdin"
+        , nargs   = '*'
         )
     cmd.add_argument \
         ( "-a", "--author"
         , dest    = "author"
         , help    = "Change default author info"
         )
+    cmd.add_argument \
+        ( "-b", "--batch"
+        , dest    = "batch"
+        , help    = "Read several puzzles (separated by blank lines) and"
+                    " output them as one document, implied if more than"
+                    " one file is given"
+        , action  = "store_true"
+        )
+    cmd.add_argument \
+        ( "-C", "--columns"
+        , dest    = "columns"
+        , help    = "Number of puzzle columns per page in batch mode,"
+                    " default: square layout"
+        , type    = int
+        )
     cmd.add_argument \
         ( "-c", "--colorconstrained"
         , dest    = "colorconstrained"
@@ -55,6 +194,20 @@ def main (argv = None):
         , help    = "Kikagaku with color areas, read additional color defs"
         , action  = "store_true"
         )
+    cmd.add_argument \
+        ( "-n", "--per-page"
+        , dest    = "per_page"
+        , help    = "Number of puzzles per page in batch mode,"
+                    " default=%(default)s"
+        , type    = int
+        , default = 4
+        )
+    cmd.add_argument \
+        ( "-s", "--solutions"
+        , dest    = "solutions"
+        , help    = "Add solution pages in batch mode"
+        , action  = "store_true"
+        )
     cmd.add_argument \
         ( "-t", "--title"
         , dest    = "title"
@@ -68,19 +221,34 @@ def main (argv = None):
         , version = "%%(prog)s %s" % VERSION
         )
     args = cmd.parse_args (argv)
+    kw   = dict \
+        ( diagonal         = args.diagonal
+        , colorconstrained = args.colorconstrained
+        , kikagaku         = args.kikagaku
+        )
+    if args.batch or len (args.file) > 1:
+        puzzles = []
+        for fn in args.file or [None]:
+            with (open (fn) if fn else sys.stdin) as f:
+                puzzles.extend (read_puzzles (f, **kw))
+        booklet \
+            ( puzzles
+            , per_page  = args.per_page
+            , columns   = args.columns
+            , solutions = args.solutions
+            , title     = args.title
+            , author    = args.author
+            )
+        return
     file = sys.stdin
     name = ''
     if args.file:
-        file = open (args.file)
-        name = args.file
+        file = open (args.file [0])
+        name = args.file [0]
     if args.title:
         name = args.title
 
-    x = Puzzle  \
-        ( diagonal         = args.diagonal
-        , colorconstrained = args.colorconstrained
-        , kikagaku         = args.kikagaku
-        )
+    x = Puzzle (**kw)
     x.from_file (file)
     x.as_tex    (title = name, author = args.author)
 # end def main
@@ -1,9 +1,57 @@
 #!/usr/bin/python3
 
 import sys
-from argparse import ArgumentParser
+from itertools import combinations
 
-def tryall (n, digitsum, exclude = (), include = (), mind = 1):
+def digit_mask (digits):
+    """ Bitmask with bit n set for each digit n
+        >>> digit_mask ((1, 3))
+        10
+    """
+    return sum (1 << d for d in set (digits))
+# end def digit_mask
+
+def mask_digits (mask):
+    """ Sorted list of digits in mask
+        >>> mask_digits (digit_mask ((9, 1, 3)))
+        [1, 3, 9]
+    """
+    return [d for d in range (1, 10) if mask & (1 << d)]
+# end def mask_digits
+
+# Bitmasks of all combinations of n different digits 1-9 indexed by
+# (n, sum of digits), in lexicographic order of the digits.
+# Computed on first use.
+sum_table = None
+
+def build_sum_table ():
+    global sum_table
+    table = {}
+    for n in range (1, 10):
+        for c in combinations (range (1, 10), n):
+            table.setdefault ((n, sum (c)), []).append (digit_mask (c))
+    sum_table = dict ((k, tuple (v)) for k, v in table.items ())
+# end def build_sum_table
+
+def sum_masks (n, digitsum, exclude = 0, include = 0):
+    """ Bitmasks of all combinations of n digits that sum to digitsum.
+        Combinations containing digits in the exclude mask or not
+        containing all digits in the include mask are filtered out.
+        >>> sum_masks (2, 17)
+        (768,)
+        >>> sum_masks (2, 3, include = digit_mask ((3,)))
+        ()
+    """
+    if sum_table is None:
+        build_sum_table ()
+    masks = sum_table.get ((n, digitsum), ())
+    if exclude or include:
+        masks = tuple \
+            (m for m in masks if not m & exclude and m & include == include)
+    return masks
+# end def sum_masks
+
+def tryall (n, digitsum, exclude = (), include = ()):
     """ Yield all possible combinations of n digits that sum to digitsum
     >>> list (tryall (5, 15))
     [[1, 2, 3, 4, 5]]
@@ -22,18 +70,14 @@ def tryall (n, digitsum, exclude = (), include = (), mind = 1):
     >>> list (tryall (3, 23, include = (6, )))
     [[6, 8, 9]]
     """
-    include = set (include)
-    for k in range (mind, 10):
-        if k in exclude:
-            continue
-        if (n == 1 and k == digitsum):
-            yield [k]
-        else:
-            for l in tryall (n - 1, digitsum - k, exclude, include, k + 1):
-                if mind > 1 or include < set ([k] + l):
-                    yield [k] + l
+    exclude = digit_mask (exclude)
+    include = digit_mask (include)
+    for m in sum_masks (n, digitsum, exclude, include):
+        yield mask_digits (m)
+# end def tryall
 
 def main (argv = None):
+    from argparse import ArgumentParser
     cmd = ArgumentParser ()
     cmd.add_argument \
         ( 'ndigits'